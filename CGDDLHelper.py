@@ -1,18 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
 from PIL import Image
 from io import BytesIO
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-# 基本配置
-BASE_URL = "https://cslabcg.whu.edu.cn"
-LOGIN_URL = f"{BASE_URL}/login/loginproc.jsp"
-CAPTCHA_URL = f"{BASE_URL}/cgjiaoyan"
+import cg_client
+from cg_client import LOGIN_BAD_CAPTCHA, LOGIN_BAD_PASSWORD, LOGIN_OK, CGClient
+from homework_store import HOMEWORK_DB_FILE, HomeworkStore
+from notify_dispatch import SMTP_HOST, SMTP_PORT, SmtpPool
+from html_extract import DEFAULT_BACKEND
+from metrics import metrics
+
+# 基本配置（平台地址、登录和课程遍历见 cg_client.py）
 CONFIG_FILE = 'config.json'
-session = requests.Session()  # 创建全局会话
+MAX_CHECK_WORKERS = 8  # 并发检查作业完成情况的最大线程数
+REQUEST_TIMEOUT = 10  # 单个请求的超时时间（秒）
 
 def load_credentials():
     """加载凭据（学号和密码）"""
@@ -36,82 +35,56 @@ def save_credentials(stid, pwd):
         json.dump({'stid': stid, 'pwd': pwd}, f)
 
 def save_config(sender_email, recipient_email, sender_password):
-    """保存配置（发件人和收件人邮箱及密码）"""
+    """保存配置（发件人和收件人邮箱及密码），保留配置文件中的其他选项"""
+    config = load_config() or {}
+    config.update({'sender_email': sender_email, 'recipient_email': recipient_email, 'sender_password': sender_password})
     with open(CONFIG_FILE, 'w') as f:
-        json.dump({'sender_email': sender_email, 'recipient_email': recipient_email, 'sender_password': sender_password}, f)
+        json.dump(config, f)
 
-def get_captcha():
+def get_captcha(client):
     """获取验证码并显示"""
-    response = session.get(CAPTCHA_URL)
-    image = Image.open(BytesIO(response.content))
+    image = Image.open(BytesIO(client.fetch_captcha()))
     image.save("captcha.png")  # 保存验证码
     image.show()  # 打开验证码，用户手动输入
     return input("请输入验证码：")
 
-def login(stid, pwd, captcha_code):
-    """登录功能"""
-    login_data = {"stid": stid, "pwd": pwd, "captchaCode": captcha_code}
-    return session.post(LOGIN_URL, data=login_data)
-
-def check_assignment_completion(url):
-    """检查作业是否完成"""
+def save_assignment_status(course_results, db_file=HOMEWORK_DB_FILE):
+    """把截止时间、完成和补交状态写入作业数据库（与在线作业提醒脚本共用）
+    first_seen 记为 0：运行时刻不是作业的发布时间，不参与提醒脚本的发布时段统计"""
+    store = HomeworkStore(db_file)
     try:
-        response = session.get(url)
-        response.raise_for_status()  # 检查请求是否成功
-        return "未提交" not in response.text  # 作业完成则返回 True
-    except requests.RequestException as e:
-        print(f"请求出错: {e}")
-        return None  # 请求出错
-
-def parse_assignments(soup):
-    """解析作业信息并检查是否完成"""
-    assignments = []
-    active_assignments_div = soup.find('div', id='activeAssignBodyDIV')
-
-    if active_assignments_div:
-        for link in active_assignments_div.find_all('a'):
-            name = link.get_text(strip=True)
-            url = BASE_URL + '/' + link['href']
-            
-            # 获取截止时间
-            due_time_span = link.find_next('span', class_='')
-            due_time = due_time_span.get_text(strip=True) if due_time_span else None
-            
-            # 检查是否为补交状态
-            badge_span = link.find_next('span', class_='badge')
-            is_late_submission = '补交时间' in badge_span.get_text(strip=True) if badge_span else False
-
-            # 检查是否已完成
-            is_completed = check_assignment_completion(url)
-
-            # 添加作业信息
-            assignments.append({
-                'name': name,
-                'url': url,
-                'due_time': due_time,
-                'is_completed': is_completed,
-                'is_late_submission': is_late_submission
-            })
-    return assignments
-
-
-def send_email(subject, body, to_email, sender_email, sender_password):
-    """发送邮件功能"""
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-
-    msg.attach(MIMEText(f"<pre>{body}</pre>", 'html', 'utf-8'))
+        store.upsert({**record._asdict(), 'first_seen': 0} for result in course_results for record in result.records
+                     if not record.is_history)
+    finally:
+        store.close()
+
 
+def send_email(subject, body, to_email, sender_email, sender_password, host=SMTP_HOST, port=SMTP_PORT):
+    """发送邮件功能（失败时自动退避重试）"""
+    smtp_pool = SmtpPool(sender_email, sender_password, host=host, port=port)
     try:
-        with smtplib.SMTP('smtp.qq.com', 587) as server:
-            server.starttls()  # 启动 TLS 加密
-            server.login(sender_email, sender_password)  # 使用配置文件中的密码
-            server.sendmail(sender_email, to_email, msg.as_string())
+        smtp_pool.send(subject, body, to_email)
         print("邮件发送成功！")
     except Exception as e:
         print(f"邮件发送失败: {e}")
+    finally:
+        smtp_pool.close()
+
+def collect_unfinished(course_results):
+    """从遍历结果中挑出在线作业页上尚未完成的作业，按课程编号组织"""
+    courses = {}
+    for i, result in enumerate(course_results, start=1):
+        if result.error:
+            print(f"检查课程《{result.course}》时出错: {result.error}")
+            continue
+        unfinished_assignments = [r for r in result.records if r.is_active and not r.is_completed]
+        if unfinished_assignments:
+            courses[str(i)] = {
+                'course_name': result.course,
+                'course_link': result.link,
+                'active_assignments': [r._asdict() for r in unfinished_assignments]
+            }
+    return courses
 
 def format_email_body(courses, stid):
     """格式化邮件内容"""
@@ -121,7 +94,7 @@ def format_email_body(courses, stid):
         email_body_lines.append(f"科目: {course_info['course_name']}\n未完成作业:")
 
         for assignment in course_info['active_assignments']:
-            email_body_lines.append(f"  - 作业名称: {assignment['name']}")
+            email_body_lines.append(f"  - 作业名称: {assignment['title']}")
             email_body_lines.append(f"    截止时间: {assignment['due_time']}")
             email_body_lines.append(f"    是否处于补交状态: {'是' if assignment['is_late_submission'] else '否'}\n")
 
@@ -145,45 +118,53 @@ def main():
 
     save_config(sender_email, recipient_email, sender_password)  # 保存配置
 
-    captcha_code = get_captcha()
-    response = login(stid, pwd, captcha_code)
-
-    if "用户名或者密码错误！" in response.text:
+    # 并发检查参数（可在 config.json 中通过 max_workers / request_timeout / http_retries 调整）
+    max_workers = config.get('max_workers', MAX_CHECK_WORKERS) if config else MAX_CHECK_WORKERS
+    timeout = config.get('request_timeout', REQUEST_TIMEOUT) if config else REQUEST_TIMEOUT
+    retries = config.get('http_retries', cg_client.RETRIES) if config else cg_client.RETRIES
+    cg_client.configure_transport(retries=retries, timeout=timeout)
+    html_backend = config.get('html_backend', DEFAULT_BACKEND) if config else DEFAULT_BACKEND
+
+    # 配置 metrics_jsonl / metrics_prom 后记录本次运行的耗时和请求统计
+    if config:
+        metrics.configure(config.get('metrics_jsonl'), config.get('metrics_prom'))
+    metrics.set_account(stid)
+    if metrics.enabled:
+        cg_client.session_hooks.append(metrics.instrument_session)
+
+    client = CGClient(stid, pwd, timeout=timeout)
+    captcha_code = get_captcha(client)
+    status, response = client.login(captcha_code)
+
+    if status == LOGIN_BAD_PASSWORD:
         print("用户名或密码错误！")
-        return
-    elif "验证码错误！" in response.text:
+        metrics.incr('login_failures')
+    elif status == LOGIN_BAD_CAPTCHA:
         print("验证码错误！！")
-        return
-    elif "选择课程" in response.text:  # 这里是通过响应数据中有无“选择课程”，判断是否登陆成功
+        metrics.incr('login_failures')
+    elif status == LOGIN_OK:  # 这里是通过响应数据中有无“选择课程”，判断是否登陆成功
         print("登录成功！学号和密码已保存")
         save_credentials(stid, pwd)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        courses = {}
-
-        for i, media_div in enumerate(soup.select('.media'), start=1):
-            course_name = media_div.select_one('strong a').text.strip()
-            course_link = f"{BASE_URL}/{media_div.select_one('strong a')['href']}"
-            session.get(course_link)
-            online_assignments_response = session.get('https://cslabcg.whu.edu.cn/assignment/mainActiveAssigns.jsp')
-            assignments = parse_assignments(BeautifulSoup(online_assignments_response.content, 'html.parser'))
-
-            unfinished_assignments = [a for a in assignments if not a['is_completed']]
-            if unfinished_assignments:
-                courses[str(i)] = {
-                    'course_name': course_name,
-                    'course_link': course_link,
-                    'active_assignments': unfinished_assignments
-                }
+
+        # 只需要在线作业页（截止时间）和详情页（是否完成），不请求作业页
+        course_results = client.walk(client.course_entries(response.text, html_backend), fetch_homework_page=False,
+                                     check_completion=True, detail_workers=max_workers, html_backend=html_backend)
+        save_assignment_status(course_results)
+        courses = collect_unfinished(course_results)
 
         if courses:
             print("未完成的作业信息：", json.dumps(courses, ensure_ascii=False, indent=2))
             email_body = format_email_body(courses, stid)
             email_subject = "希冀课程未完成作业信息"
-            send_email(email_subject, email_body, recipient_email, sender_email, sender_password)
+            send_email(email_subject, email_body, recipient_email, sender_email, sender_password,
+                       host=config.get('smtp_host', SMTP_HOST) if config else SMTP_HOST,
+                       port=config.get('smtp_port', SMTP_PORT) if config else SMTP_PORT)
         else:
             print("所有作业均已完成！")
     else:
         print("登陆失败，意料外的错误")
+        metrics.incr('login_failures')
+    metrics.end_cycle(account=stid)
 
 
 if __name__ == "__main__":
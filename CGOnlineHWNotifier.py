@@ -1,23 +1,34 @@
 import requests
-from bs4 import BeautifulSoup
-from PIL import Image
 from io import BytesIO
-from plyer import notification
+import argparse
 import json
+import sys
+import threading
 import time
-import pytesseract
-import cv2
-import numpy as np
 import os
 import platform
-from playsound import playsound
-
-# --- 基本配置 ---
-BASE_URL = "https://cslabcg.whu.edu.cn"
-LOGIN_URL = f"{BASE_URL}/login/loginproc.jsp"
-CAPTCHA_URL = f"{BASE_URL}/cgjiaoyan"
+from collections import namedtuple
+import asyncio
+import cg_client
+from cg_client import CONNECT_TIMEOUT, COURSE_LIST_MARKER, COURSE_WORKERS, LOGIN_BAD_CAPTCHA, LOGIN_BAD_PASSWORD, \
+    LOGIN_OK, READ_TIMEOUT, CGClient
+from fetch_cache import FETCH_CACHE_FILE, FetchCache
+from history_archive import HISTORY_ARCHIVE_FILE, HistoryArchive
+from homework_diff import CHANGE_LABELS, NEW, changed_keys, describe, diff, snapshots_from_rows
+from homework_store import HOMEWORK_DB_FILE, HomeworkStore, homework_id
+from rate_limit import DEFAULT_RATE, RateLimiter
+from notify_dispatch import NOTIFY_WINDOW, SMTP_HOST, SMTP_PORT, Alert, NotificationDispatcher, SmtpPool, \
+    desktop_notify, format_digest
+from html_extract import DEFAULT_BACKEND
+from metrics import metrics
+from scheduler import FAST_LOGIN, MANUAL_NEEDED, NEAR_DEADLINE_SECONDS, POLL_MAX_INTERVAL, POLL_MIN_INTERVAL, \
+    SLOW_POLLING, AdaptivePoller, BackgroundWorker, jittered, run_blocking
+
+# --- 基本配置（平台地址、登录和课程遍历见 cg_client.py） ---
 CONFIG_FILE = 'config.json'
-KNOWN_HOMEWORK_FILE = 'known_homework.json'
+KNOWN_HOMEWORK_FILE = 'known_homework.json'  # 旧版的已知作业列表，启动时自动导入数据库
+SESSION_FILE = 'session.json'  # 持久化的登录会话（cookies 和课程列表页面）
+COURSE_PAGE_MAX_AGE = 6 * 60 * 60  # 缓存的课程列表页面最长使用 6 小时，之后重新登录获取（发现新加入的课程）
 CHECK_INTERVAL_SECONDS = 30
 FAILURE_THRESHOLD = 3  # 连续失败3次后要求手动
 ALERT_SOUND_FILE = 'alert.wav'
@@ -25,21 +36,60 @@ SLOW_CHECK_INTERVAL = 60 * 5 # 慢登录状态下的检查间隔（5分钟）
 ERROR_CHECK_INTERVAL = 30 # 登录失败下重试间隔（半分钟）
 FAST_RETRY_INTERVAL = 3  # 快登录状态下的重试间隔
 FAILURE_THRESHOLD = 6    # 两种模式下的失败阈值
-
-session = requests.Session()
-session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-})
+INTERVAL_JITTER = 0.1    # 检查间隔的随机抖动比例
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+platform_limiter = RateLimiter(DEFAULT_RATE)  # 所有账号共享的对 cslabcg.whu.edu.cn 的请求限速
+cg_client.set_rate_limiter(platform_limiter)
+
+# --- 按需加载的依赖 ---
+# OpenCV/NumPy/Tesseract（验证码识别）、PIL（验证码图片）、plyer（桌面通知）、playsound（警报声）都在第一次用到时才导入；
+# 会话仍然有效时只走网络和解析路径，启动时间和内存占用里都没有这些库
+tesseract_path = None     # Windows 下由 get_config() 设置，加载识别模块时生效
+captcha_backend = 'auto'  # 由 main() 根据 config.json 的 captcha_solver 设置
+captcha_variants = None   # 由 main() 根据 config.json 的 captcha_variants 设置，None 时用 captcha_solver 的默认值
+_captcha_solver = None
+_captcha_solver_lock = threading.Lock()
+
+
+def load_captcha_solver():
+    """第一次自动识别验证码时才导入 captcha_solver（及 OpenCV、NumPy、Tesseract），之后直接返回同一个模块"""
+    global _captcha_solver
+    with _captcha_solver_lock:
+        if _captcha_solver is None:
+            import pytesseract
+            import captcha_solver
+            if tesseract_path:
+                pytesseract.pytesseract.tesseract_cmd = tesseract_path
+            captcha_solver.set_backend(captcha_backend)
+            if captcha_variants:
+                captcha_solver.set_variants(captcha_variants)
+            _captcha_solver = captcha_solver
+        return _captcha_solver
+
+
+def save_captcha_sample(config, image, code, solved):
+    if config.get('collect_captcha_samples', True):
+        import captcha_dataset
+        captcha_dataset.save_sample(image, code, solved)
+
+
+def new_session():
+    """创建平台会话；全局限速由会话挂载的共享适配器执行"""
+    new = requests.Session()
+    new.headers.update({'User-Agent': USER_AGENT})
+    return cg_client.prepare_session(new)
 
 
 # --- 配置管理模块 (无需修改) ---
 def get_config():
+    global tesseract_path
     config = {}
     if os.path.exists(CONFIG_FILE):
         with open(CONFIG_FILE, 'r') as f:
             config = json.load(f)
 
-    if 'stid' not in config or 'pwd' not in config:
+    if not config.get('accounts') and ('stid' not in config or 'pwd' not in config):
         print("首次运行或配置不完整，请输入您的凭据。")
         config['stid'] = input("请输入学号：")
         config['pwd'] = input("请输入密码：")
@@ -56,89 +106,161 @@ def get_config():
                     break
                 else:
                     print("路径无效或不是tesseract.exe文件，请重新输入。")
-        pytesseract.pytesseract.tesseract_cmd = config['tesseract_path']
+        tesseract_path = config['tesseract_path']
 
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f, indent=4)
 
-    print(f"配置加载成功。学号: {config['stid']}")
+    if config.get('accounts'):
+        print(f"配置加载成功。多账号模式，学号: {', '.join(a['stid'] for a in config['accounts'])}")
+    else:
+        print(f"配置加载成功。学号: {config['stid']}")
     if 'tesseract_path' in config:
         print(f"Tesseract路径: {config['tesseract_path']}")
     return config
 
 
-# --- 作业状态管理 (无需修改) ---
-def load_known_homework():
-    if not os.path.exists(KNOWN_HOMEWORK_FILE): return set()
-    try:
-        with open(KNOWN_HOMEWORK_FILE, 'r', encoding='utf-8') as f:
-            return set(json.load(f))
-    except (json.JSONDecodeError, FileNotFoundError):
-        return set()
+# --- 作业状态管理 (SQLite，增量写入) ---
+def load_known_homework(store, account):
+    imported = store.import_known_homework_file(account.stid, account.known_homework_file)
+    if imported:
+        print(f"[{account.stid}] 已从 {account.known_homework_file} 导入 {imported} 个已知作业。")
+    return store.known_ids(account.stid)
+
+
+# --- 账号 ---
+def request_timeout(config):
+    return config.get('connect_timeout', CONNECT_TIMEOUT), config.get('read_timeout', READ_TIMEOUT)
+
+
+def account_file(filename, suffix):
+    root, ext = os.path.splitext(filename)
+    return f"{root}{suffix}{ext}"
+
 
+class Account:
+    """一个被监控的账号：独立的平台客户端（会话）、登录状态、页面缓存和已知作业文件
+    单账号时沿用原有文件名，多账号时文件名带上学号后缀"""
 
-def save_known_homework(known_homework_set):
-    with open(KNOWN_HOMEWORK_FILE, 'w', encoding='utf-8') as f:
-        json.dump(list(known_homework_set), f, ensure_ascii=False, indent=4)
+    def __init__(self, config, suffix=''):
+        self.config = config
+        self.stid = config['stid']
+        self.client = CGClient(self.stid, config['pwd'], session_factory=new_session,
+                               timeout=request_timeout(config))
+        self.session = self.client.session
+        # 并行遍历课程用的工作客户端，各自单独登录（course_workers 包括账号会话本身，为 1 时不并行）
+        self.worker_clients = [CGClient(self.stid, config['pwd'], session_factory=new_session,
+                                        timeout=request_timeout(config))
+                               for _ in range(config.get('course_workers', COURSE_WORKERS) - 1)]
+        self.session_file = account_file(SESSION_FILE, suffix)
+        self.known_homework_file = account_file(KNOWN_HOMEWORK_FILE, suffix)
+        self.fetch_cache = FetchCache(account_file(FETCH_CACHE_FILE, suffix))
+        self.cached_course_page = None
+        self.course_page_saved_at = 0
+        self.snapshots = {}  # 作业ID -> homework_diff.Snapshot，用于检测截止时间、补交和完成情况的变化
+
+
+def load_accounts(config):
+    """config.json 中有 accounts 列表时为多账号模式，每个账号的配置项覆盖全局配置"""
+    if not config.get('accounts'):
+        return [Account(config)]
+    return [Account({**config, **entry}, suffix=f"_{entry['stid']}") for entry in config['accounts']]
+
+
+# --- 会话持久化 ---
+# 已登录会话缓存的课程列表页面，与登录响应一样只需要 .text 属性
+CachedCoursePage = namedtuple('CachedCoursePage', ['text'])
+
+
+def save_session_state(account, course_page_html):
+    account.course_page_saved_at = time.time()
+    state = {'cookies': requests.utils.dict_from_cookiejar(account.session.cookies), 'course_page': course_page_html,
+             'saved_at': account.course_page_saved_at,
+             'workers': [requests.utils.dict_from_cookiejar(client.session.cookies)
+                         for client in account.worker_clients]}
+    with open(account.session_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+
+
+def load_session_state(account):
+    """恢复上次保存的 cookies，返回缓存的课程列表页面；没有可用状态时返回 None"""
+    if not os.path.exists(account.session_file): return None
+    try:
+        with open(account.session_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        account.session.cookies.update(state['cookies'])
+        for client, cookies in zip(account.worker_clients, state.get('workers', [])):
+            client.session.cookies.update(cookies)
+        account.course_page_saved_at = state.get('saved_at', 0)
+        return state['course_page']
+    except (json.JSONDecodeError, KeyError, FileNotFoundError):
+        return None
 
 
 # --- 验证码识别模块 (无需修改) ---
-def solve_captcha(force_manual=False):
+def solve_captcha(client, force_manual=False):
+    """返回 (验证码, 验证码图片)，识别失败时验证码为 None"""
     print("正在获取验证码...")
     try:
-        response = session.get(CAPTCHA_URL)
-        response.raise_for_status()
-        img_bytes = response.content
+        from PIL import Image
+        img_bytes = client.fetch_captcha()
         image = Image.open(BytesIO(img_bytes))
 
         if force_manual:
             print("OCR长时间失败，需要您手动干预！")
             image.show()
-            return input("请手动输入5位验证码：")
-
-        img_np = np.array(image.convert('RGB'))
-        gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (3, 3), 0)
-        binary = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-
-        char_whitelist = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
-        custom_config = f'--oem 3 --psm 8 -c tessedit_char_whitelist={char_whitelist}'
+            return input("请手动输入5位验证码："), image
 
-        code = pytesseract.image_to_string(binary, config=custom_config).strip()
-
-        print(f"OCR识别结果: '{code}'")
-        if len(code) == 5 and code.isalnum():
-            return code
+        # 预处理、预检和识别由 captcha_solver 完成（Tesseract 或模板匹配）
+        code = load_captcha_solver().recognize(image)
+        if code:
+            return code, image
         else:
             print("OCR识别失败或结果格式不符，本轮跳过。")
-            return None
+            return None, image
 
     except Exception as e:
         print(f"处理验证码时出错: {e}")
-        return None
+        return None, None
 
 
 # --- 核心逻辑 (登录部分无需修改) ---
-def login(config, force_manual=False):
-    captcha_code = solve_captcha(force_manual)
+def login(account, force_manual=False, client=None):
+    """client 缺省为账号客户端；传入工作客户端时为它单独登录（得到另一个服务器会话）"""
+    config = account.config
+    client = client or account.client
+    with metrics.span('solve_captcha'):
+        captcha_code, captcha_image = solve_captcha(client, force_manual)
+    if not force_manual:
+        metrics.incr('ocr_attempts')
 
     if captcha_code is None:
         return None
 
-    login_data = {"stid": config['stid'], "pwd": config['pwd'], "captchaCode": captcha_code}
-
     try:
-        response = session.post(LOGIN_URL, data=login_data)
-        response.raise_for_status()
+        status, response = client.login(captcha_code)
 
-        if "用户名或者密码错误！" in response.text:
+        if status == LOGIN_BAD_PASSWORD:
             print("登录失败：用户名或密码错误！")
             return None
-        elif "验证码错误！" in response.text:
+        elif status == LOGIN_BAD_CAPTCHA:
             print("登录失败：验证码错误！")
+            save_captcha_sample(config, captcha_image, captcha_code, solved=False)
+            if not force_manual:
+                load_captcha_solver().stats.record_login(False)
+                print(load_captcha_solver().stats.report())
             return None
-        elif "选择课程" in response.text:
+        elif status == LOGIN_OK:
             print("登录成功！")
+            if not force_manual:
+                metrics.incr('ocr_accepted')
+                load_captcha_solver().stats.record_login(True)
+                print(load_captcha_solver().stats.report())
+            # 登录成功的验证码用于扩充模板库；手动登录时识别模块还没加载就不为此加载，样本仍会保存
+            if not force_manual or _captcha_solver is not None:
+                load_captcha_solver().learn(captcha_image, captcha_code)
+            save_captcha_sample(config, captcha_image, captcha_code, solved=True)
+            save_session_state(account, response.text)
             return response
         else:
             print("登录失败：未知错误。")
@@ -148,174 +270,365 @@ def login(config, force_manual=False):
         return None
 
 
+def ensure_login(account, force_manual=False):
+    """会话仍然有效时直接复用，只有过期（或要求手动）时才重新识别验证码并登录。
+    探测到的页面就是课程选择页时用它更新课程列表；否则缓存的课程列表超过
+    course_page_max_age 后也重新登录，以免一直看不到新加入的课程"""
+    if not force_manual:
+        if account.cached_course_page is None:
+            account.cached_course_page = load_session_state(account)
+        page = account.client.probe_session() if account.cached_course_page else None
+        if page is not None and COURSE_LIST_MARKER in page:
+            account.cached_course_page = page
+            save_session_state(account, page)
+        max_age = account.config.get('course_page_max_age', COURSE_PAGE_MAX_AGE)
+        if page is not None and time.time() - account.course_page_saved_at < max_age:
+            print(f"[{account.stid}] 会话仍然有效，跳过登录。")
+            return CachedCoursePage(account.cached_course_page)
+        if page is not None:
+            print(f"[{account.stid}] 缓存的课程列表已过期，重新登录...")
+        else:
+            print(f"[{account.stid}] 会话已过期或不存在，重新登录...")
+    response = login(account, force_manual)
+    if response:
+        account.cached_course_page = response.text
+    else:
+        metrics.incr('login_failures')
+    return response
+
+
+def worker_sessions(account):
+    """并行遍历课程用的会话：账号会话，加上仍然有效或本轮自动登录成功的工作会话。
+    工作会话每轮最多自动登录一次，失败时这一轮不参与遍历，课程由其余会话分担"""
+    sessions = [account.session]
+    for index, client in enumerate(account.worker_clients, start=1):
+        if client.is_session_alive():
+            sessions.append(client.session)
+            continue
+        print(f"[{account.stid}] 工作会话 {index} 未登录或已过期，单独登录...")
+        if login(account, client=client):
+            sessions.append(client.session)
+        else:
+            print(f"[{account.stid}] 工作会话 {index} 登录失败，本轮不参与遍历。")
+    return sessions
+
+
 # --- 作业检查逻辑 (已复用您的关键逻辑) ---
 # --- 作业检查逻辑 (增加“显示历史”功能) ---
-def check_for_new_homework(login_response, known_homework_set, show_history=False):
-    print("开始解析课程列表并检查作业...")
-    new_homework_found = []
+def notify_new_homework(item):
+    course_name, title = item
+    desktop_notify(*format_digest(None, [Alert(None, course_name, title)]))
 
-    soup = BeautifulSoup(login_response.text, 'html.parser')
 
-    course_divs = soup.select('.media')
-    if not course_divs:
+def check_for_new_homework(account, login_response, known_homework_set, show_history=False,
+                           html_backend=DEFAULT_BACKEND, notify=notify_new_homework,
+                           fetch_due_times=True, check_completion=False, snapshots=None, history_archive=None):
+    """一次遍历所有课程并报告新作业，返回各课程的 CourseResult（HomeworkRecord.is_new 标记新作业）
+    notify 接收 (课程名, 作业标题)，调度器传入的是投递到通知分发队列的函数；
+    提供 history_archive 时每次遍历都增量同步历史作业，只展示新归档的部分"""
+    print("开始解析课程列表并检查作业...")
+    course_entries = account.client.course_entries(login_response.text, html_backend)
+    if not course_entries:
         print("错误：登录成功但未在页面中找到任何课程。")
-        return new_homework_found
-
-    for media_div in course_divs:
-        course_name = media_div.select_one('strong a').text.strip()
-
-        try:
-            course_link = f"{BASE_URL}/{media_div.select_one('strong a')['href']}"
-            session.get(course_link)
-            session.get(f"{BASE_URL}/main.jsp")
-            hw_page_res = session.get(f"{BASE_URL}/includes/redirect.jsp?tab=-2")
-            hw_page_res.raise_for_status()
-
-            homework_soup = BeautifulSoup(hw_page_res.text, 'html.parser')
-
-            # --- 1. 检查当前作业 (逻辑不变) ---
-            current_hw_div = homework_soup.select_one("div.list-group-flush.mb-4")
-            if not current_hw_div:
-                print(f"✅ 课程《{course_name}》当前无作业。")
-            else:
-                hw_items = current_hw_div.select("a.list-group-item")
-                print(f"🔍 正在检查课程《{course_name}》，发现 {len(hw_items)} 个当前作业...")
-                for item in hw_items:
-                    title = item.get_text(strip=True)
-                    homework_id = f"{course_name}::{title}"
-                    href = item['href']
-                    link = f"{BASE_URL}/{href}" if not href.startswith("http") else href
-                    print(f"  当前作业  - {title} 链接：{link}")
-                    if homework_id not in known_homework_set:
-                        print(f"🚨 发现新作业! 🚨\n  - 课程: {course_name}\n  - 作业: {title}")
-                        notification.notify(title=f"【新作业】{course_name}", message=f"任务：{title}", timeout=180)
-                        new_homework_found.append(homework_id)
-
-            # --- 2. 仅在首次运行时展示历史作业 ---
-            if show_history:
-                history_hw_headers = homework_soup.select("h5 span strong")
-                for h in history_hw_headers:
-                    if "历史作业" in h.get_text():
-                        history_hw_div = h.find_parent("h5").find_next_sibling("div")
-                        if history_hw_div:
-                            print(f"📜 课程《{course_name}》历史作业：")
-                            for a in history_hw_div.find_all("a"):
-                                title = a.get_text(strip=True)
-                                href = a['href']
-                                link = f"{BASE_URL}/{href}" if not href.startswith("http") else href
-                                print(f"    - {title} 链接：{link}")
-
-        except Exception as e:
-            print(f"检查课程《{course_name}》时出错: {e}")
-
-    if show_history:
+        return []
+
+    # 没有归档时，首次运行需要完整解析以展示历史作业，此时不使用缓存
+    archived = history_archive is not None
+    course_results = account.client.walk(
+        course_entries, sessions=worker_sessions(account), known_ids=known_homework_set, cache=account.fetch_cache,
+        use_cache=archived or not show_history, include_history=archived or show_history,
+        fetch_active=fetch_due_times, check_completion=check_completion, html_backend=html_backend, snapshots=snapshots,
+        history_archive=history_archive)
+    for result in course_results:
+        course_name = result.course
+        if result.error:
+            print(f"检查课程《{course_name}》时出错: {result.error}")
+            account.fetch_cache.invalidate(result.link)  # 解析失败时下次必须重新完整解析
+            continue
+
+        # --- 1. 检查当前作业 (逻辑不变) ---
+        current = [record for record in result.records if not record.is_history]
+        if result.unchanged:
+            print(f"⏩ 课程《{course_name}》作业页面未变化，跳过解析。")
+        elif not current:
+            print(f"✅ 课程《{course_name}》当前无作业。")
+        else:
+            print(f"🔍 正在检查课程《{course_name}》，发现 {len(current)} 个当前作业...")
+            for record in current:
+                due = f" 截止：{record.due_time}" if record.due_time else ""
+                print(f"  当前作业  - {record.title} 链接：{record.link}{due}")
+        for record in current:
+            if record.is_new:
+                print(f"🚨 发现新作业! 🚨\n  - 课程: {course_name}\n  - 作业: {record.title}")
+                notify((course_name, record.title))
+
+        # --- 2. 展示历史作业（有归档时只展示新归档的） ---
+        history = [record for record in result.records if record.is_history]
+        if history:
+            print(f"📜 课程《{course_name}》{'新归档的' if archived else ''}历史作业：")
+            for record in history:
+                print(f"    - {record.title} 链接：{record.link}")
+
+    print(account.fetch_cache.stats())
+    account.fetch_cache.save()
+
+    if show_history and archived:
+        total = sum(count for _, _, count in history_archive.counts(account.stid))
+        print(f"历史作业已归档 {total} 条，可用 python history_archive.py 查询。")
+    elif show_history:
         print("\n" + "=" * 25 + " 首次历史作业展示完毕 " + "=" * 25 + "\n")
 
-    return new_homework_found
-
+    return course_results
 
-# --- 主循环 (全新的状态机逻辑) ---
-def main():
-    print("--- 希冀平台在线作业提醒脚本 (状态机版) ---")
-    try:
-        config = get_config()
-    except Exception as e:
-        print(f"初始化配置失败: {e}"); return
 
-    known_homework = load_known_homework()
-    print(f"已加载 {len(known_homework)} 个已知作业。")
+# --- 主循环 (异步调度版状态机) ---
+def play_alert(failures, mode_name):
+    print("\n" + "=" * 50)
+    print(f"!! {mode_name}连续失败 {failures} 次，需要手动干预！")
+    print("=" * 50 + "\n")
+    if os.path.exists(ALERT_SOUND_FILE):
+        try:
+            from playsound import playsound
+            playsound(ALERT_SOUND_FILE)
+        except Exception as e:
+            print(f"播放警报声失败: {e}")
+
+
+async def monitor(account, store, dispatcher, saver, manual_lock, once=False, history_archive=None):
+    """单个账号的状态机：快登录 -> 慢轮询，自动识别连续失败时进入手动状态；扫描、通知、保存互不阻塞
+    once 为 True 时完成一次扫描后返回 True，需要手动登录时返回 False"""
+    config = account.config
+    metrics.set_account(account.stid)  # 每个账号是独立的 asyncio 任务，本任务中记录的指标只归入这个账号
+    known_homework = load_known_homework(store, account)
+    print(f"[{account.stid}] 已加载 {len(known_homework)} 个已知作业。")
+    account.snapshots = snapshots_from_rows(store.records(account.stid))
+    html_backend = config.get('html_backend', DEFAULT_BACKEND)
+    jitter = config.get('interval_jitter', INTERVAL_JITTER)
+    fetch_due_times = config.get('fetch_due_times', True)
+    # 默认每次扫描都检查完成情况（只为列表有变化或需要复查的作业请求详情页），notify_changes 控制是否提醒变化
+    track_completion = config.get('track_completion', True)
+    notify_changes = config.get('notify_changes', True)
 
-    # --- 状态变量初始化 ---
-    is_in_fast_mode = True
     is_initial_history_shown = False
+    ddl_digest_pending = bool(config.get('ddl_digest'))
+    # 账号第一次扫描时已经存在的作业不是刚发布的，first_seen 记为 0，不参与发布时段统计
+    first_scan = not known_homework
+
+    async def scan(login_response):
+        nonlocal is_initial_history_shown, ddl_digest_pending, first_scan
+        # 需要发送 ddl 小助手摘要时，这一次遍历顺带检查作业是否完成，不再单独登录和遍历
+        course_results = await run_blocking(
+            check_for_new_homework, account, login_response, known_homework,
+            show_history=not is_initial_history_shown, html_backend=html_backend,
+            notify=lambda item: dispatcher.submit(Alert(account.stid, *item)), fetch_due_times=fetch_due_times,
+            check_completion=track_completion or ddl_digest_pending, snapshots=account.snapshots,
+            history_archive=history_archive)
+        is_initial_history_shown = True
+        records = [record for result in course_results for record in result.records if not record.is_history]
+        previous = account.snapshots
+        changes, account.snapshots = diff(previous, records)
+        for change in changes:
+            if change.kind == NEW:  # 新作业仍按 is_new 提醒（只看作业页“当前作业”，与原有逻辑一致）
+                continue
+            print(f"[{account.stid}] 【{CHANGE_LABELS[change.kind]}】{change.course}：{change.title}（{describe(change)}）")
+            if notify_changes:
+                dispatcher.submit(Alert(account.stid, change.course, change.title, change.kind, describe(change)))
+        new_items = [record for record in records if record.is_new]
+        # 只保存新作业和快照有变化的作业；notified 标记这些作业已经由提醒脚本判断过
+        changed = changed_keys(previous, account.snapshots)
+        dirty = [record for record in records if record.is_new or homework_id(record.course, record.title) in changed]
+        if dirty:
+            extra = {'notified': True, 'first_seen': 0} if first_scan else {'notified': True}
+            saver.submit([{**record._asdict(), **extra} for record in dirty])
+        first_scan = False
+        if new_items:
+            known_homework.update(homework_id(record.course, record.title) for record in new_items)
+        else:
+            print(f"[{account.stid}] 本次检查未发现新作业。")
+        if ddl_digest_pending and course_results:
+            ddl_digest_pending = False
+            await run_blocking(send_ddl_digest, config, account.stid, course_results)
+        return bool(new_items)
+
+    poller = None
+    if config.get('adaptive_polling', True):
+        poller = AdaptivePoller(SLOW_CHECK_INTERVAL, min_interval=config.get('poll_min_interval', POLL_MIN_INTERVAL),
+                                max_interval=config.get('poll_max_interval', POLL_MAX_INTERVAL),
+                                near_deadline=config.get('near_deadline_hours', NEAR_DEADLINE_SECONDS / 3600) * 3600)
+        poller.learn_publish_times(store.first_seen_times(account.stid))
+
+    def next_slow_interval(found_new):
+        """慢轮询间隔：开启自适应轮询时根据截止时间和发布规律计算，否则固定为 SLOW_CHECK_INTERVAL"""
+        if poller is None:
+            return SLOW_CHECK_INTERVAL
+        if found_new:
+            poller.learn_publish_times(store.first_seen_times(account.stid))
+        now = time.time()
+        pending = store.pending_due_between(now, now + poller.near_deadline, account.stid)
+        interval, reason = poller.next_interval(found_new, [row['due_ts'] for row in pending], now)
+        print(f"[{account.stid}] 自适应轮询：{reason}，下次间隔 {interval:.0f} 秒；"
+              f"今日已向平台发出 {platform_limiter.requests_today} 次请求。")
+        return interval
+
+    return await poll(account, scan, manual_lock, jitter, next_slow_interval, once)
+
+
+async def poll(account, scan, manual_lock, jitter, next_slow_interval, once=False):
+    """登录状态的转换与等待；每轮登录成功后调用 scan，并由 next_slow_interval 决定下次间隔
+    登录和扫描不设整体截止时间：每个请求都有连接/读取超时，而放弃等待的线程仍会继续使用账号会话、发送提醒，
+    与下一轮的登录和选课互相干扰，所以每轮都等上一轮的登录和扫描结束后再开始"""
+    state = FAST_LOGIN
     fast_mode_attempts = 0
     slow_mode_failures = 0
 
-    print("\n>>> 进入【快登录状态】，将进行最多3次快速尝试...")
+    print(f"\n>>> [{account.stid}] 进入【快登录状态】，将进行最多{FAILURE_THRESHOLD}次快速尝试...")
     while True:
+        print(f"\n--- {time.strftime('%Y-%m-%d %H:%M:%S')} [{account.stid}] [{state}] ---")
+        scanned = False
         try:
-            print(f"\n--- {time.strftime('%Y-%m-%d %H:%M:%S')} ---")
-
-            # 第一次登录逻辑
-            if is_in_fast_mode:
-                # --- 快登录状态逻辑 ---
-                login_response = login(config)
-                if login_response:  # 快速登录成功
-                    is_in_fast_mode = False  # 永久退出快登录模式
-                    print(">>> 快速登录成功！退出【快登录状态】，进入【慢登录状态】。")
-                    new_items = check_for_new_homework(login_response, known_homework,
-                                                       show_history=not is_initial_history_shown)
-                    is_initial_history_shown = True  # 标记历史已显示
-                    if new_items:
-                        known_homework.update(new_items); save_known_homework(known_homework)
-                    else:
-                        print("本次检查未发现新作业。")
-                    time.sleep(SLOW_CHECK_INTERVAL)
-                else:  # 快速登录失败
+            if state == MANUAL_NEEDED:
+                # 手动输入没有截止时间，等待用户处理；多个账号同时需要手动时依次进行
+                async with manual_lock:
+                    print(f"[{account.stid}] 需要手动登录。")
+                    await run_blocking(play_alert, fast_mode_attempts or slow_mode_failures,
+                                       "快登录状态" if fast_mode_attempts else "慢登录状态")
+                    manual_response = await run_blocking(ensure_login, account, force_manual=True)
+                fast_mode_attempts = slow_mode_failures = 0  # 提醒后重置计数器，给用户新的机会
+                print(">>> 进入【慢登录状态】。")
+                state = SLOW_POLLING
+                found_new = await scan(manual_response) if manual_response else False
+                scanned = bool(manual_response)
+                delay = next_slow_interval(found_new)
+            else:
+                login_response = await run_blocking(ensure_login, account)
+                if login_response:
+                    if state == FAST_LOGIN:
+                        print(">>> 快速登录成功！退出【快登录状态】，进入【慢登录状态】。")
+                    state = SLOW_POLLING
+                    slow_mode_failures = 0
+                    found_new = await scan(login_response)
+                    scanned = True
+                    delay = next_slow_interval(found_new)
+                elif state == FAST_LOGIN:
                     fast_mode_attempts += 1
                     if fast_mode_attempts < FAILURE_THRESHOLD:
                         print(f"快速登录失败第 {fast_mode_attempts} 次，等待 {FAST_RETRY_INTERVAL} 秒后重试...")
-                        time.sleep(FAST_RETRY_INTERVAL)
-                    else:  # 3次快速失败，强制手动
-                        is_in_fast_mode = False  # 永久退出快登录模式
-                        print("\n" + "=" * 50);
-                        print(f"!! 快登录状态连续失败 {fast_mode_attempts} 次，需要手动干预！");
-                        print("=" * 50 + "\n")
-                        if os.path.exists(ALERT_SOUND_FILE):
-                            try:
-                                playsound(ALERT_SOUND_FILE)
-                            except Exception as e:
-                                print(f"播放警报声失败: {e}")
-
-                        manual_response = login(config, force_manual=True)  # 进行一次手动登录
-                        print(">>> 退出【快登录状态】，进入【慢登录状态】。")
-                        if manual_response:
-                            new_items = check_for_new_homework(manual_response, known_homework,
-                                                               show_history=not is_initial_history_shown)
-                            is_initial_history_shown = True
-                            if new_items: known_homework.update(new_items); save_known_homework(known_homework)
-                        time.sleep(SLOW_CHECK_INTERVAL)
-
-            # --- 第一次登录之后 ---
-            else:
-                # --- 慢登录状态逻辑 ---
-                force_manual = False
-                if slow_mode_failures >= FAILURE_THRESHOLD:
-                    print("\n" + "=" * 50);
-                    print(f"!! 慢登录状态连续失败 {slow_mode_failures} 次，需要手动干预！");
-                    print("=" * 50 + "\n")
-                    if os.path.exists(ALERT_SOUND_FILE):
-                        try:
-                            playsound(ALERT_SOUND_FILE)
-                        except Exception as e:
-                            print(f"播放警报声失败: {e}")
-                    force_manual = True
-                    slow_mode_failures = 0  # 提醒后重置计数器，给用户新的3次机会
-
-                login_response = login(config, force_manual=force_manual)
-                if login_response:
-                    slow_mode_failures = 0  # 成功后重置计数器
-                    new_items = check_for_new_homework(login_response, known_homework,
-                                                       show_history=not is_initial_history_shown)
-                    is_initial_history_shown = True
-                    if new_items:
-                        known_homework.update(new_items); save_known_homework(known_homework)
+                        delay = FAST_RETRY_INTERVAL
                     else:
-                        print("本次检查未发现新作业。")
-                        print(f"--- 等待 {SLOW_CHECK_INTERVAL} 秒后进行下一次检查 ---")
-                        time.sleep(SLOW_CHECK_INTERVAL)
+                        state, delay = MANUAL_NEEDED, 0
                 else:
-                    slow_mode_failures += 1  # 失败后增加计数器
+                    slow_mode_failures += 1
                     print(f"慢登录状态失败，累计失败次数: {slow_mode_failures}")
-                    print(f"--- 等待 {ERROR_CHECK_INTERVAL} 秒后进行下一次检查 ---")
-                    time.sleep(ERROR_CHECK_INTERVAL)
-
-
+                    if slow_mode_failures >= FAILURE_THRESHOLD:
+                        state, delay = MANUAL_NEEDED, 0
+                    else:
+                        delay = ERROR_CHECK_INTERVAL
         except Exception as e:
             print(f"主循环中发生未预料的错误: {e}")
-            print(f"--- 系统异常，等待 {ERROR_CHECK_INTERVAL} 秒后重试 ---")
-            time.sleep(ERROR_CHECK_INTERVAL)
+            delay = ERROR_CHECK_INTERVAL
+            if once:
+                metrics.end_cycle(account=account.stid, state=state)
+                return False
+
+        metrics.end_cycle(account=account.stid, state=state)
+        if once and scanned:
+            return True
+        if once and state == MANUAL_NEEDED:
+            print(f"[{account.stid}] 自动登录连续失败，单次检查模式不等待手动输入。")
+            return False
+        if delay:
+            delay = jittered(delay, jitter)
+            print(f"--- 等待 {delay:.0f} 秒后进行下一次检查 ---")
+            await asyncio.sleep(delay)
+
+
+def send_ddl_digest(config, stid, course_results):
+    """config.json 中 ddl_digest 为 true 时，启动后第一次扫描的结果同时生成 CGDDLHelper 的未完成作业邮件"""
+    import CGDDLHelper
+    courses = CGDDLHelper.collect_unfinished(course_results)
+    if not courses:
+        print(f"[{stid}] 所有作业均已完成！")
+        return
+    if not (config.get('sender_email') and config.get('recipient_email')):
+        print(f"[{stid}] 未配置邮箱，跳过未完成作业邮件。")
+        return
+    CGDDLHelper.send_email("希冀课程未完成作业信息", CGDDLHelper.format_email_body(courses, stid),
+                           config['recipient_email'], config['sender_email'], config.get('sender_password'),
+                           host=config.get('smtp_host', SMTP_HOST), port=config.get('smtp_port', SMTP_PORT))
+
+
+def create_dispatcher(config):
+    """config.json 中 email_alerts 为 true 且配置了邮箱时，新作业提醒同时发送邮件"""
+    smtp_pool = None
+    if config.get('email_alerts') and config.get('sender_email') and config.get('recipient_email'):
+        smtp_pool = SmtpPool(config['sender_email'], config.get('sender_password'),
+                             host=config.get('smtp_host', SMTP_HOST), port=config.get('smtp_port', SMTP_PORT),
+                             use_tls=config.get('smtp_tls', True))
+    return NotificationDispatcher(window=config.get('notify_window', NOTIFY_WINDOW),
+                                  desktop=config.get('desktop_alerts', True), smtp_pool=smtp_pool,
+                                  recipient_email=config.get('recipient_email')).start()
+
+
+async def run(config, once=False):
+    """once 为 True 时每个账号只完成一次检查，返回是否全部成功"""
+    accounts = load_accounts(config)
+    # 通知分发和状态保存各自在后台完成，慢的弹窗或邮件不会推迟下一次扫描；所有账号共用它们、
+    # 同一个事件循环和线程池，以及 captcha_solver 中的 OCR 引擎和 platform_limiter 限速
+    dispatcher = create_dispatcher(config)
+    store = HomeworkStore(config.get('homework_db', HOMEWORK_DB_FILE))
+    saver = BackgroundWorker('状态保存', store.upsert).start()
+    history_archive = HistoryArchive(config.get('history_archive', HISTORY_ARCHIVE_FILE))
+    manual_lock = asyncio.Lock()
+    try:
+        results = await asyncio.gather(*(monitor(account, store, dispatcher, saver, manual_lock, once, history_archive)
+                                         for account in accounts))
+        return all(results)
+    finally:
+        print("正在停止后台任务...")
+        await run_blocking(dispatcher.close)
+        await saver.stop()
+        store.close()
+        history_archive.close()
+
+
+def apply_config(config):
+    """把 config.json 中的全局设置应用到验证码识别、限速、连接池和指标统计；coordinator.py 的工作进程启动时也会调用"""
+    global captcha_backend, captcha_variants, tesseract_path
+    captcha_backend = config.get('captcha_solver', 'auto')
+    captcha_variants = config.get('captcha_variants')
+    tesseract_path = config.get('tesseract_path', tesseract_path)
+    platform_limiter.rate = config.get('max_requests_per_second', DEFAULT_RATE)
+    # 连接池大小、重试次数和退避基数可在 config.json 中通过 pool_size / http_retries / retry_backoff 调整
+    cg_client.configure_transport(pool_size=config.get('pool_size', cg_client.POOL_SIZE),
+                                  retries=config.get('http_retries', cg_client.RETRIES),
+                                  backoff=config.get('retry_backoff', cg_client.RETRY_BACKOFF),
+                                  timeout=request_timeout(config))
+    # 配置 metrics_jsonl / metrics_prom 后记录每轮耗时和请求统计
+    metrics.configure(config.get('metrics_jsonl'), config.get('metrics_prom'))
+    if metrics.enabled:
+        cg_client.session_hooks.append(metrics.instrument_session)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="希冀平台在线作业提醒")
+    parser.add_argument('--check-once', action='store_true',
+                        help="只检查一次后退出（适合 cron），自动登录失败时不等待手动输入，退出码为 1")
+    args = parser.parse_args(argv)
+
+    print("--- 希冀平台在线作业提醒脚本 (状态机版) ---")
+    try:
+        config = get_config()
+        apply_config(config)
+    except Exception as e:
+        print(f"初始化配置失败: {e}"); return 1
+
+    try:
+        ok = asyncio.run(run(config, once=args.check_once))
+    except KeyboardInterrupt:
+        print("已退出。")
+        return 130
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
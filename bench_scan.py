@@ -0,0 +1,259 @@
+import argparse
+import functools
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from PIL import Image, ImageDraw
+
+import CGOnlineHWNotifier as notifier
+import captcha_solver
+import cg_client
+import replay
+from fetch_cache import FetchCache
+from html_extract import DEFAULT_BACKEND, extract_active_assignments, extract_courses, extract_current_homework
+
+# --- 扫描基准测试 ---
+# 用 replay.py 录制的响应离线重放一轮完整检查（取验证码+OCR、登录、一次遍历所有课程并检查完成情况），
+# 报告端到端耗时、每轮请求数和下载量、HTML 解析耗时和 OCR 耗时。用法：
+#   python bench_scan.py record real            # 登录真实平台并录制到 fixtures/real/
+#   python bench_scan.py sample                 # 用 fixtures/*.html 生成离线示例 fixtures/sample/
+#   python bench_scan.py run sample --cycles 20 --latency 0.05
+SAMPLE_CAPTCHA_CODE = 'a3K9x'
+DEFAULT_CYCLES = 10
+DEFAULT_LATENCY = 0.05  # 回放时每个请求的模拟网络延迟（秒）
+UNLIMITED_RATE = 1e9    # 基准测试默认关闭 platform_limiter
+
+
+class PhaseTimer:
+    """按名称累计耗时；多个线程中的解析耗时会被累加"""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] += seconds
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+
+
+def install_parse_timers(timer):
+    """把 cg_client 中用到的 html_extract 函数替换为计时版本"""
+    for name in ('extract_courses', 'extract_current_homework', 'extract_history_homework',
+                 'extract_active_assignments'):
+        setattr(cg_client, name, timer.wrap('parse', getattr(cg_client, name)))
+
+
+def mount_everywhere(adapter_factory):
+    """让之后新建的所有平台会话（包括并行遍历用的工作会话）都挂载录制/回放适配器"""
+    cg_client.session_hooks.append(functools.partial(replay.mount, adapter_factory=adapter_factory))
+
+
+# --- 录制 ---
+def record(name):
+    """登录真实平台，完整遍历一次所有课程（含历史作业和作业详情页），把响应保存到 fixtures/<name>/"""
+    cassette = replay.Cassette(name)
+    mount_everywhere(lambda: replay.RecordingAdapter(cassette))
+    config = notifier.get_config()
+    config['collect_captcha_samples'] = False
+    account = notifier.Account(config)
+    account.session_file = os.path.join(tempfile.mkdtemp(), notifier.SESSION_FILE)
+
+    response = None
+    for _ in range(notifier.FAILURE_THRESHOLD):
+        response = notifier.login(account)
+        if response:
+            break
+    if not response:
+        response = notifier.login(account, force_manual=True)
+    if not response:
+        print("登录失败，未录制。")
+        return
+
+    notifier.check_for_new_homework(account, response, set(), show_history=True, check_completion=True)
+    cassette.save()
+    print(f"已录制 {len(cassette.entries)} 个响应到 {cassette.path}")
+
+
+# --- 离线示例 ---
+class _FakeResponse:
+    def __init__(self, url, content, content_type, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+
+
+def sample_captcha():
+    image = Image.new('L', (100, 30), 255)
+    ImageDraw.Draw(image).text((10, 8), SAMPLE_CAPTCHA_CODE, fill=0)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def build_sample_cassette(name='sample'):
+    """用 fixtures 目录中的示例页面拼出一组完整的录制响应，不需要访问平台"""
+    def read_fixture(filename):
+        with open(os.path.join(replay.FIXTURE_DIR, filename), 'rb') as f:
+            return f.read()
+
+    cassette = replay.Cassette(name)
+    html = 'text/html;charset=UTF-8'
+    course_page = read_fixture('sample_course_list.html')
+    homework_page = read_fixture('sample_homework_page.html')
+    active_page = read_fixture('sample_active_assigns.html')
+
+    def put(method, url, content, context=None, content_type=html):
+        cassette.put(replay.request_key(method, url, context), _FakeResponse(url, content, content_type))
+
+    put('GET', cg_client.CAPTCHA_URL, sample_captcha(), content_type='image/png')
+    put('POST', cg_client.LOGIN_URL, course_page)
+    put('GET', cg_client.MAIN_URL, course_page)  # 会话探测（尚未选课时访问 main.jsp）
+    for _, href in extract_courses(course_page.decode('utf-8')):
+        context = '/' + href
+        put('GET', f"{cg_client.BASE_URL}/{href}", course_page)
+        put('GET', cg_client.MAIN_URL, b'<html></html>', context)
+        put('GET', cg_client.HOMEWORK_PAGE_URL, homework_page, context)
+        put('GET', cg_client.ACTIVE_ASSIGNS_URL, active_page, context)
+    links = {item['href'] for item in extract_active_assignments(active_page)}
+    links.update(href for _, href in extract_current_homework(homework_page.decode('utf-8')) or [])
+    for href in links:
+        url = cg_client.absolute_link(href)
+        put('GET', url, '<html>已提交</html>'.encode('utf-8'))
+        # 工作会话上一轮停在详情页，下一轮的会话探测以它为上下文
+        parts = urlsplit(url)
+        put('GET', cg_client.MAIN_URL, b'<html></html>', f"{parts.path}?{parts.query}" if parts.query else parts.path)
+    cassette.save()
+    print(f"已生成 {len(cassette.entries)} 个示例响应到 {cassette.path}")
+
+
+# --- 回放基准 ---
+def run_cycle(account, timer, html_backend, warm):
+    """一轮完整检查：验证码 OCR、登录、一次遍历（新作业、截止时间和完成情况）"""
+    if not warm:
+        if os.path.exists(account.fetch_cache.path):
+            os.remove(account.fetch_cache.path)
+        account.fetch_cache = FetchCache(account.fetch_cache.path)
+
+    start = time.perf_counter()
+    captcha = account.client.fetch_captcha()
+    ocr_start = time.perf_counter()
+    try:
+        code = captcha_solver.recognize(Image.open(BytesIO(captcha)))
+    except Exception as e:
+        print(f"OCR 出错: {e}")
+        code = None
+    timer.add('ocr', time.perf_counter() - ocr_start)
+
+    # 回放的登录响应与验证码无关，OCR 失败也照常继续，保证每轮扫描的工作量一致
+    _, login_response = account.client.login(code or '')
+
+    scan_start = time.perf_counter()
+    notifier.check_for_new_homework(account, login_response, set(), html_backend=html_backend,
+                                    notify=lambda item: None, check_completion=True)
+    timer.add('scan', time.perf_counter() - scan_start)
+
+    timer.add('total', time.perf_counter() - start)
+    return code is not None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench(name, cycles=DEFAULT_CYCLES, latency=DEFAULT_LATENCY, jitter=0.0, html_backend=DEFAULT_BACKEND, warm=False,
+          rate=None, course_workers=1):
+    """rate 为 None 时不限速，只测量扫描本身；传入每秒请求数可观察全局限速的影响。
+    course_workers 大于 1 时用多个会话并行遍历课程"""
+    cassette = replay.Cassette(name)
+    if not cassette.entries:
+        print(f"{cassette.path} 中没有录制的响应，请先运行 record 或 sample。")
+        return None
+    notifier.platform_limiter.rate = rate or UNLIMITED_RATE
+    notifier.platform_limiter.burst = 1 if rate else UNLIMITED_RATE
+    replay_stats = replay.ReplayStats()
+    mount_everywhere(lambda: replay.ReplayAdapter(cassette, latency, jitter, replay_stats))
+    timer = PhaseTimer()
+    install_parse_timers(timer)
+
+    workdir = tempfile.mkdtemp()
+    account = notifier.Account({'stid': 'bench', 'pwd': '', 'course_workers': course_workers})
+    # 回放不下发 cookie：给工作会话一个会话 ID，让它们被视为已登录（每轮仍各探测一次）
+    for client in account.worker_clients:
+        client.session.cookies.set('JSESSIONID', 'bench')
+    account.fetch_cache = FetchCache(os.path.join(workdir, notifier.FETCH_CACHE_FILE))
+
+    rows = []
+    ocr_ok = 0
+    for _ in range(cycles):
+        timer.reset()
+        replay_stats.reset()
+        ocr_ok += run_cycle(account, timer, html_backend, warm)
+        rows.append({**timer.totals, 'requests': replay_stats.requests, 'bytes': replay_stats.bytes})
+
+    def summary(key, scale=1000, unit='ms'):
+        values = [row.get(key, 0.0) * scale for row in rows]
+        return (f"平均 {statistics.mean(values):8.1f} {unit}  p50 {percentile(values, 0.5):8.1f} {unit}  "
+                f"p95 {percentile(values, 0.95):8.1f} {unit}")
+
+    print(f"\n=== 扫描基准：{name}，{cycles} 轮，模拟延迟 {latency * 1000:.0f} ms，"
+          f"解析后端 {html_backend}，{'热' if warm else '冷'}缓存，{f'限速 {rate} 次/秒' if rate else '不限速'} ===")
+    print(f"端到端耗时        {summary('total')}")
+    print(f"  课程遍历        {summary('scan')}")
+    print(f"HTML 解析（累计） {summary('parse')}")
+    print(f"验证码 OCR        {summary('ocr')}  识别成功 {ocr_ok}/{cycles}")
+    print(f"每轮请求数        {summary('requests', 1, '次')}")
+    print(f"每轮下载量        {summary('bytes', 1 / 1024, 'KB')}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制平台响应并离线测量扫描性能")
+    sub = parser.add_subparsers(dest='command', required=True)
+    record_parser = sub.add_parser('record', help="登录真实平台并录制响应")
+    record_parser.add_argument('name')
+    sample_parser = sub.add_parser('sample', help="用 fixtures/*.html 生成离线示例")
+    sample_parser.add_argument('name', nargs='?', default='sample')
+    run_parser = sub.add_parser('run', help="回放录制的响应并报告耗时")
+    run_parser.add_argument('name', nargs='?', default='sample')
+    run_parser.add_argument('--cycles', type=int, default=DEFAULT_CYCLES)
+    run_parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY)
+    run_parser.add_argument('--jitter', type=float, default=0.0, help="延迟抖动比例")
+    run_parser.add_argument('--html-backend', default=DEFAULT_BACKEND)
+    run_parser.add_argument('--warm', action='store_true', help="保留页面指纹缓存，测量页面未变化时的开销")
+    run_parser.add_argument('--rate', type=float, default=None, help="按该速率（次/秒）限速，默认不限速")
+    run_parser.add_argument('--course-workers', type=int, default=1, help="并行遍历课程的会话数，默认 1（不并行）")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.name)
+    elif args.command == 'sample':
+        build_sample_cassette(args.name)
+    else:
+        bench(args.name, args.cycles, args.latency, args.jitter, args.html_backend, args.warm,
+              args.rate, args.course_workers)
+
+
+if __name__ == "__main__":
+    main()
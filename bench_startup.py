@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cg_client
+import replay
+
+# --- 启动开销测量 ---
+# 在独立的子进程中测量 CGOnlineHWNotifier 的冷启动：只导入模块，以及用 replay.py 的示例录制离线运行一次
+# --check-once（会话仍然有效，不需要识别验证码）。报告墙钟时间、峰值内存（RSS）和加载了哪些重量级依赖。用法：
+#   python bench_scan.py sample          # 先生成离线示例 fixtures/sample/
+#   python bench_startup.py --runs 5
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('cv2', 'numpy', 'pytesseract', 'PIL.Image', 'plyer', 'playsound', 'CGDDLHelper')
+DEFAULT_RUNS = 5
+
+# 子进程中执行：argv 为 [场景, 录制名称, 结果文件]
+CHILD_SCRIPT = """
+import functools, json, resource, sys
+scenario, cassette_name, result_file = sys.argv[1:4]
+code = 0
+if scenario == 'import':
+    import CGOnlineHWNotifier
+else:
+    import cg_client, replay
+    cassette = replay.Cassette(cassette_name)
+    cg_client.session_hooks.append(functools.partial(replay.mount,
+                                                     adapter_factory=lambda: replay.ReplayAdapter(cassette)))
+    import CGOnlineHWNotifier
+    if scenario == 'check-once-ocr':
+        CGOnlineHWNotifier.load_captcha_solver()
+    code = CGOnlineHWNotifier.main(['--check-once'])
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(result_file, 'w') as f:
+    json.dump({'exit_code': code, 'peak_kb': peak // 1024 if sys.platform == 'darwin' else peak,
+               'loaded': [name for name in %r if name in sys.modules]}, f)
+""" % (HEAVY_MODULES,)
+
+SCENARIOS = {
+    'import': "只导入模块",
+    'check-once': "--check-once（会话有效）",
+    'check-once-ocr': "--check-once + 预先加载 OCR",
+}
+
+
+def prepare_workdir(cassette):
+    """离线运行所需的工作目录：配置、有效会话（cookies 和课程列表页面）"""
+    workdir = tempfile.mkdtemp()
+    config = {'stid': 'bench', 'pwd': '', 'desktop_alerts': False, 'collect_captcha_samples': False,
+              'max_requests_per_second': 1e9}
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    found = cassette.get(replay.request_key('POST', cg_client.LOGIN_URL, None))
+    with open(os.path.join(workdir, 'session.json'), 'w', encoding='utf-8') as f:
+        json.dump({'cookies': {'JSESSIONID': 'bench'}, 'course_page': found[1].decode('utf-8'),
+                   'workers': [{'JSESSIONID': f'bench-{index}'} for index in range(1, cg_client.COURSE_WORKERS)]}, f)
+    return workdir
+
+
+def run_child(scenario, cassette):
+    """每次使用新的工作目录，已知作业和页面缓存都从空开始"""
+    workdir = prepare_workdir(cassette)
+    result_file = os.path.join(workdir, 'result.json')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', CHILD_SCRIPT, scenario, cassette.path, result_file], cwd=workdir, env=env,
+                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    elapsed = time.perf_counter() - start
+    with open(result_file, 'r') as f:
+        return {'seconds': elapsed, **json.load(f)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量提醒脚本的冷启动时间和峰值内存")
+    parser.add_argument('name', nargs='?', default='sample', help="fixtures 下的录制名称")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help="只运行指定场景，可重复；默认全部")
+    args = parser.parse_args()
+
+    cassette = replay.Cassette(args.name)
+    if not cassette.entries:
+        print(f"{cassette.path} 中没有录制的响应，请先运行 python bench_scan.py sample。")
+        return
+    print(f"=== 启动开销：{args.name}，每个场景 {args.runs} 次 ===")
+    for scenario in args.scenario or SCENARIOS:
+        rows = [run_child(scenario, cassette) for _ in range(args.runs)]
+        seconds = [row['seconds'] * 1000 for row in rows]
+        peaks = [row['peak_kb'] / 1024 for row in rows]
+        print(f"{SCENARIOS[scenario]:<28} 耗时 中位 {statistics.median(seconds):7.1f} ms  最小 {min(seconds):7.1f} ms  "
+              f"峰值内存 {statistics.median(peaks):6.1f} MB  退出码 {rows[-1]['exit_code']}")
+        print(f"{'':<28} 已加载: {', '.join(rows[-1]['loaded']) or '无'}")
+
+
+if __name__ == "__main__":
+    main()
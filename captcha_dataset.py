@@ -0,0 +1,81 @@
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+# --- 验证码样本库 ---
+# 登录成功的验证码以答案命名存入 solved/，验证码错误的以当时的识别结果命名存入 failed/，
+# 文件名格式 <5位验证码>_<毫秒时间戳>.png，可直接作为 captcha_solver.py 的对比样本目录。
+# 在线脚本只用到 save_sample，captcha_solver（OpenCV、NumPy）在评估和调参时才导入
+DATASET_DIR = 'captcha_dataset'
+SOLVED_DIR = os.path.join(DATASET_DIR, 'solved')
+FAILED_DIR = os.path.join(DATASET_DIR, 'failed')
+
+# 调参时搜索的预处理参数网格
+BLUR_KERNELS = (1, 3, 5)
+BLOCK_SIZES = (7, 9, 11, 15, 21)
+C_VALUES = (0, 2, 4, 6)
+
+
+def save_sample(image, code, solved):
+    """保存一张验证码样本；图片转为灰度 PNG 以减小体积"""
+    directory = SOLVED_DIR if solved else FAILED_DIR
+    os.makedirs(directory, exist_ok=True)
+    image.convert('L').save(os.path.join(directory, f"{code}_{int(time.time() * 1000)}.png"), optimize=True)
+
+
+def load_samples(directory):
+    import captcha_solver
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.png'))):
+        with Image.open(path) as image:
+            samples.append((image.convert('RGB'), os.path.basename(path)[:captcha_solver.CAPTCHA_LENGTH]))
+    return samples
+
+
+def evaluate(params, solved, failed, engine):
+    """返回 (已解样本的正确率, 失败样本中能得到合法格式结果的比例)"""
+    import captcha_solver
+    correct = sum(engine.recognize(captcha_solver.preprocess(image, params)) == code for image, code in solved)
+    well_formed = sum(captcha_solver.is_valid_code(engine.recognize(captcha_solver.preprocess(image, params)))
+                      for image, _ in failed)
+    return (correct / len(solved) if solved else 0.0,
+            well_formed / len(failed) if failed else 0.0)
+
+
+def tune(limit=None):
+    """在样本库上网格搜索预处理参数，打印每组参数的成功率并把最佳参数写入 captcha_params.json"""
+    import captcha_solver
+    solved = load_samples(SOLVED_DIR)[:limit]
+    failed = load_samples(FAILED_DIR)[:limit]
+    if not solved:
+        print(f"{SOLVED_DIR} 中没有已解样本，请先正常运行脚本积累样本。")
+        return None
+    print(f"已解样本 {len(solved)} 张，失败样本 {len(failed)} 张。")
+    engine = captcha_solver.get_tesseract_engine()
+
+    results = []
+    for blur_kernel, block_size, c in itertools.product(BLUR_KERNELS, BLOCK_SIZES, C_VALUES):
+        params = {'blur_kernel': blur_kernel, 'block_size': block_size, 'c': c}
+        accuracy, well_formed = evaluate(params, solved, failed, engine)
+        results.append((accuracy, well_formed, params))
+        print(f"  blur={blur_kernel} block={block_size:<2} C={c}  正确率 {accuracy:6.1%}  失败样本格式合法率 {well_formed:6.1%}")
+
+    accuracy, _, best = max(results, key=lambda r: (r[0], r[1]))
+    print(f"\n最佳参数: {best}，正确率 {accuracy:.1%}（当前参数: {captcha_solver.preprocess_params}）")
+    with open(captcha_solver.PARAMS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(best, f, indent=4)
+    print(f"已写入 {captcha_solver.PARAMS_FILE}，下次运行时自动生效。")
+    return best
+
+
+if __name__ == "__main__":
+    # 用法: python captcha_dataset.py tune [每类最多使用的样本数]
+    if len(sys.argv) < 2 or sys.argv[1] != 'tune':
+        print("用法: python captcha_dataset.py tune [每类最多使用的样本数]")
+        sys.exit(1)
+    tune(int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,436 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+
+import cv2
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+    HAS_TESSEROCR = True
+except ImportError:
+    HAS_TESSEROCR = False
+
+# --- 验证码识别引擎 ---
+CHAR_WHITELIST = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+CAPTCHA_LENGTH = 5
+MIN_INK_RATIO = 0.02   # 二值化后前景像素占比低于该值，基本是空白图
+MAX_INK_RATIO = 0.5    # 高于该值，噪声过多无法识别
+MIN_INK_SPAN = 0.3     # 含前景的列范围至少占图像宽度的比例
+GLYPH_LIBRARY_FILE = 'glyph_library.npz'
+GLYPH_SIZE = (12, 16)  # 单个字符归一化后的 (宽, 高)
+MIN_LIBRARY_SIZE = 200  # 'auto' 模式下字形库至少有这么多样本才开始检验模板匹配
+MAX_GLYPHS_PER_LABEL = 40  # 每个字符最多保留的字形样本数，超出时丢弃最早的，字形库文件大小有上限
+MIN_HELD_OUT_CHECKS = 20  # 'auto' 模式下至少留出检验这么多张验证码，且模板匹配答对的更多，才改用模板匹配
+SOLVER_BACKENDS = ('tesseract', 'template', 'auto')
+PARAMS_FILE = 'captcha_params.json'  # 由 captcha_dataset.py tune 写入的最佳预处理参数
+DEFAULT_PARAMS = {'blur_kernel': 3, 'block_size': 11, 'c': 2}
+DEFAULT_VARIANTS = 1   # 每张验证码生成的预处理候选数（1 为原有的单次识别）；基准显示成功率有提升后再调大
+MAX_VARIANTS = 7       # variant_params 能给出的参数组合数
+BENCHMARK_VARIANTS = (1, 3, 5, MAX_VARIANTS)  # benchmark() 比较的候选数
+
+
+def load_params(path=PARAMS_FILE):
+    params = dict(DEFAULT_PARAMS)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                params.update({k: v for k, v in json.load(f).items() if k in DEFAULT_PARAMS})
+        except (json.JSONDecodeError, FileNotFoundError):
+            pass
+    return params
+
+
+preprocess_params = load_params()
+
+
+def preprocess(image, params=None):
+    """PIL 图像 -> 二值化的 NumPy 数组（文字为白色）；params 缺省时使用当前最佳参数"""
+    params = params or preprocess_params
+    img_np = np.array(image.convert('RGB'))
+    gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
+    kernel = params['blur_kernel']
+    blur = cv2.GaussianBlur(gray, (kernel, kernel), 0) if kernel > 1 else gray
+    return cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                 params['block_size'], params['c'])
+
+
+# --- 多候选预处理 ---
+# 同一张验证码按多组相近的参数各生成一张二值图：灰度化只做一次，每种模糊核、每种(模糊核, 块大小)的局部均值各算一次，
+# 最后的阈值比较对所有组合一次向量化完成（结果与逐组调用 cv2.adaptiveThreshold 相同）。
+# 各候选并行识别后按字符位置多数投票，单组参数识别不出5位结果时，常常能由其他组补齐，省下一次重新取验证码和等待
+def variant_params(count=DEFAULT_VARIANTS, base=None):
+    """以当前最佳参数为第一组，依次加入相近的参数组合（去重），返回前 count 组"""
+    base = base or preprocess_params
+    kernel, block, c = base['blur_kernel'], base['block_size'], base['c']
+    candidates = [(kernel, block, c), (kernel, block, c + 2), (kernel, block + 4, c),
+                  (1 if kernel > 1 else 3, block, c), (kernel, max(3, block - 4), c), (kernel, block, max(0, c - 1)),
+                  (kernel + 2, block, c)]
+    params = []
+    for blur_kernel, block_size, offset in candidates:
+        entry = {'blur_kernel': blur_kernel, 'block_size': block_size, 'c': offset}
+        if entry not in params:
+            params.append(entry)
+    return params[:max(1, count)]
+
+
+def preprocess_variants(image, params_list):
+    """PIL 图像 -> (组数, 高, 宽) 的二值图数组，第 i 张与 preprocess(image, params_list[i]) 相同"""
+    gray = cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_BGR2GRAY)
+    blurred = {kernel: cv2.GaussianBlur(gray, (kernel, kernel), 0) if kernel > 1 else gray
+               for kernel in {p['blur_kernel'] for p in params_list}}
+    # 与 adaptiveThreshold 计算高斯局部均值的方式相同：float32 上模糊、同样的边界处理，再四舍五入为整数
+    means = {(kernel, block): np.rint(cv2.GaussianBlur(blurred[kernel].astype(np.float32), (block, block), 0,
+                                                       borderType=cv2.BORDER_REPLICATE | cv2.BORDER_ISOLATED))
+             for kernel, block in {(p['blur_kernel'], p['block_size']) for p in params_list}}
+    src = np.stack([blurred[p['blur_kernel']] for p in params_list]).astype(np.int16)
+    mean = np.stack([means[p['blur_kernel'], p['block_size']] for p in params_list]).astype(np.int16)
+    offsets = np.array([p['c'] for p in params_list], dtype=np.int16)[:, None, None]
+    # THRESH_BINARY_INV：像素不高于 (局部均值 - C) 时为前景
+    return np.where(src <= mean - offsets, 255, 0).astype(np.uint8)
+
+
+def vote(codes):
+    """在格式合法的候选中按字符位置多数投票，票数相同时取排在前面的候选；没有合法候选时返回 None"""
+    valid = [code for code in codes if is_valid_code(code)]
+    if not valid:
+        return None
+    result = []
+    for position in range(CAPTCHA_LENGTH):
+        chars = [code[position] for code in valid]
+        result.append(max(chars, key=lambda ch: (chars.count(ch), -chars.index(ch))))
+    return ''.join(result)
+
+
+def is_readable(binary):
+    """OCR 之前的廉价预检：前景占比和水平跨度明显异常的图片直接放弃"""
+    ink = binary > 0
+    ink_ratio = ink.mean()
+    if not MIN_INK_RATIO <= ink_ratio <= MAX_INK_RATIO:
+        return False
+    ink_columns = np.flatnonzero(ink.any(axis=0))
+    return ink_columns.size > 0 and (ink_columns[-1] - ink_columns[0] + 1) / binary.shape[1] >= MIN_INK_SPAN
+
+
+def is_valid_code(code):
+    return len(code) == CAPTCHA_LENGTH and code.isalnum()
+
+
+class PytesseractEngine:
+    """每次识别都启动一次 tesseract 子进程（原有方式）"""
+    name = 'pytesseract'
+
+    def __init__(self):
+        self.config = f'--oem 3 --psm 8 -c tessedit_char_whitelist={CHAR_WHITELIST}'
+
+    def recognize(self, binary):
+        return pytesseract.image_to_string(binary, config=self.config).strip()
+
+
+class TesserocrEngine:
+    """通过 tesserocr 常驻的 TessBaseAPI 句柄识别；句柄不是线程安全的，每个识别线程各建一个，模型每个线程只加载一次"""
+    name = 'tesserocr'
+
+    def __init__(self):
+        from PIL import Image
+        self._image_from_array = Image.fromarray
+        self._local = threading.local()
+        self._api()  # 在创建引擎的线程中先加载模型
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_WORD)
+            api.SetVariable('tessedit_char_whitelist', CHAR_WHITELIST)
+            self._local.api = api
+        return api
+
+    def recognize(self, binary):
+        api = self._api()
+        api.SetImage(self._image_from_array(binary))
+        return api.GetUTF8Text().strip()
+
+
+def segment(binary, count=CAPTCHA_LENGTH):
+    """按列投影把二值图切成 count 个字符，返回 (count, 宽*高) 的浮点矩阵；切分失败返回 None"""
+    ink_columns = (binary > 0).any(axis=0)
+    # 找出连续的有墨迹列区间 [start, end)
+    edges = np.diff(np.concatenate(([0], ink_columns.astype(np.int8), [0])))
+    segments = list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+    segments = [(start, end) for start, end in segments if end - start > 1]  # 去掉孤立噪点列
+    if not segments:
+        return None
+    # 粘连的字符：反复从中间切开最宽的区间；断裂的字符：反复合并间隔最小的相邻区间
+    while len(segments) < count:
+        widest = max(range(len(segments)), key=lambda i: segments[i][1] - segments[i][0])
+        start, end = segments[widest]
+        if end - start < 4:
+            return None
+        middle = (start + end) // 2
+        segments[widest:widest + 1] = [(start, middle), (middle, end)]
+    while len(segments) > count:
+        closest = min(range(len(segments) - 1), key=lambda i: segments[i + 1][0] - segments[i][1])
+        segments[closest:closest + 2] = [(segments[closest][0], segments[closest + 1][1])]
+
+    glyphs = np.empty((count, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+    for i, (start, end) in enumerate(segments):
+        column = binary[:, start:end]
+        rows = np.flatnonzero(column.any(axis=1))
+        glyph = column[rows[0]:rows[-1] + 1]
+        glyphs[i] = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel() / 255.0
+    return glyphs
+
+
+def _keep_newest(vectors, labels, limit=MAX_GLYPHS_PER_LABEL):
+    """每个字符只保留最后学到的 limit 个样本（样本按学习顺序排列）"""
+    unique, counts = np.unique(labels, return_counts=True)
+    if not (counts > limit).any():
+        return vectors, labels
+    keep = np.ones(len(labels), dtype=bool)
+    for label in unique[counts > limit]:
+        keep[np.flatnonzero(labels == label)[:-limit]] = False
+    return vectors[keep], labels[keep]
+
+
+class GlyphLibrary:
+    """从已确认正确的验证码中积累的字形样本，用最近邻做分类"""
+
+    def __init__(self, path=GLYPH_LIBRARY_FILE):
+        self.path = path
+        self.vectors = np.empty((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+        self.labels = np.empty(0, dtype='<U1')
+        self.checks = np.zeros(3, dtype=np.int64)  # 留出检验：[检验次数, Tesseract 答对, 模板匹配答对]
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                self.vectors, self.labels = _keep_newest(data['vectors'], data['labels'])
+                if 'checks' in data:
+                    self.checks = data['checks']
+
+    def __len__(self):
+        return len(self.labels)
+
+    def learn(self, binary, code):
+        glyphs = segment(binary, len(code))
+        if glyphs is None:
+            return False
+        with self._lock:
+            self.vectors, self.labels = _keep_newest(np.concatenate((self.vectors, glyphs)),
+                                                     np.concatenate((self.labels, np.array(list(code), dtype='<U1'))))
+        return True
+
+    def classify(self, glyphs):
+        """向量化的最近邻：||a-b||² = ||a||² - 2a·b + ||b||²，一次矩阵乘法算出所有距离"""
+        with self._lock:
+            vectors, labels = self.vectors, self.labels
+        distances = ((glyphs ** 2).sum(axis=1)[:, None] - 2 * glyphs @ vectors.T
+                     + (vectors ** 2).sum(axis=1)[None, :])
+        return ''.join(labels[distances.argmin(axis=1)])
+
+    def record_check(self, tesseract_ok, template_ok):
+        with self._lock:
+            self.checks = self.checks + (1, tesseract_ok, template_ok)
+
+    def outperforms_tesseract(self, min_checks=MIN_HELD_OUT_CHECKS):
+        """字形库足够大、留出检验足够多，且模板匹配答对的次数多于 Tesseract"""
+        checked, tesseract_correct, template_correct = self.checks
+        return len(self) >= MIN_LIBRARY_SIZE and checked >= min_checks and template_correct > tesseract_correct
+
+    def save(self):
+        with self._lock:
+            np.savez_compressed(self.path, vectors=self.vectors, labels=self.labels, checks=self.checks)
+
+
+class TemplateEngine:
+    """离线模板匹配：切分字符后与字形库做最近邻匹配，不依赖 Tesseract"""
+    name = 'template'
+
+    def __init__(self, library=None):
+        self.library = library if library is not None else GlyphLibrary()
+
+    def recognize(self, binary):
+        if not len(self.library):
+            return ''
+        glyphs = segment(binary)
+        return self.library.classify(glyphs) if glyphs is not None else ''
+
+
+class SolveStats:
+    """统计每次识别的耗时、预检拒绝数，以及识别结果提交登录后的准确率"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.rejected = 0
+        self.malformed = 0
+        self.submitted = 0
+        self.accepted = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_solve(self, seconds, rejected=False, malformed=False):
+        with self._lock:
+            self.attempts += 1
+            self.total_seconds += seconds
+            self.rejected += rejected
+            self.malformed += malformed
+
+    def record_login(self, accepted):
+        with self._lock:
+            self.submitted += 1
+            self.accepted += accepted
+
+    def report(self):
+        avg_ms = self.total_seconds / self.attempts * 1000 if self.attempts else 0.0
+        accuracy = self.accepted / self.submitted if self.submitted else 0.0
+        return (f"验证码识别 {self.attempts} 次，平均耗时 {avg_ms:.1f} ms，预检拒绝 {self.rejected} 次，"
+                f"格式不符 {self.malformed} 次；提交 {self.submitted} 次，通过 {self.accepted} 次（准确率 {accuracy:.0%}）")
+
+
+_engine = None
+_template_engine = None
+_engine_lock = threading.Lock()
+_ocr_pool = None
+solver_backend = 'auto'
+variant_count = DEFAULT_VARIANTS
+stats = SolveStats()
+
+
+def set_backend(name):
+    """选择识别后端：'tesseract'、'template'，或 'auto'（留出检验中模板匹配比 Tesseract 准确时用模板匹配）"""
+    global solver_backend
+    if name not in SOLVER_BACKENDS:
+        raise ValueError(f"未知的验证码识别后端: {name}")
+    solver_backend = name
+
+
+def set_variants(count):
+    """每张验证码的预处理候选数，1 表示只用当前最佳参数识别一次"""
+    global variant_count
+    variant_count = min(MAX_VARIANTS, max(1, int(count)))
+
+
+def get_ocr_pool():
+    """并行识别候选的线程池：pytesseract 每次识别是一个独立的 tesseract 子进程，tesserocr 每个线程有自己的句柄，
+    多个候选可以同时占用多个 CPU 核"""
+    global _ocr_pool
+    with _engine_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=MAX_VARIANTS, thread_name_prefix='验证码识别')
+        return _ocr_pool
+
+
+def get_tesseract_engine():
+    """返回进程内共享的 OCR 引擎，首次使用时创建；优先使用常驻的 tesserocr"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TesserocrEngine() if HAS_TESSEROCR else PytesseractEngine()
+            print(f"验证码识别引擎: {_engine.name}")
+            if not HAS_TESSEROCR:
+                print("提示：未安装 tesserocr，每次识别都要启动 tesseract 进程并加载模型；"
+                      "pip install tesserocr 后改用常驻内存的引擎（见 README）。")
+        return _engine
+
+
+def get_template_engine():
+    global _template_engine
+    with _engine_lock:
+        if _template_engine is None:
+            _template_engine = TemplateEngine()
+        return _template_engine
+
+
+def get_engine():
+    if solver_backend == 'template':
+        return get_template_engine()
+    if solver_backend == 'auto' and get_template_engine().library.outperforms_tesseract():
+        return get_template_engine()
+    return get_tesseract_engine()
+
+
+def recognize(image, engine=None, variants=None):
+    """识别验证码图片，结果不是5位字母数字时返回 None；variants（缺省为 variant_count）大于 1 时
+    用多组预处理参数并行识别，再按字符位置投票"""
+    start = time.perf_counter()
+    binaries = [binary for binary in preprocess_variants(image, variant_params(variants or variant_count))
+                if is_readable(binary)]
+    if not binaries:
+        stats.record_solve(time.perf_counter() - start, rejected=True)
+        print("验证码图片预检未通过，跳过OCR。")
+        return None
+    engine = engine or get_engine()
+    if len(binaries) == 1:
+        codes = [engine.recognize(binaries[0])]
+    else:
+        codes = list(get_ocr_pool().map(engine.recognize, binaries))
+    code = vote(codes)
+    stats.record_solve(time.perf_counter() - start, malformed=code is None)
+    if len(codes) == 1:
+        print(f"OCR识别结果: '{codes[0]}'")
+    else:
+        print(f"OCR识别结果: '{code or ''}'（{len(codes)} 组候选: {codes}）")
+    return code
+
+
+def learn(image, code):
+    """登录成功说明 code 是正确答案，把它的字形加入模板库
+    'auto' 模式下加入之前先让两个后端各识别一次（此时字形库里还没有这张验证码，即留出检验），
+    累计的答对次数决定 get_engine() 是否改用模板匹配。样本都来自登录成功的验证码，大多是当前后端答对的，
+    检验结果偏向当前后端，只有模板匹配明显更准时才会切换"""
+    binary = preprocess(image)
+    template_engine = get_template_engine()
+    library = template_engine.library
+    if solver_backend == 'auto' and len(library) >= MIN_LIBRARY_SIZE:
+        try:
+            tesseract_ok = get_tesseract_engine().recognize(binary) == code
+            template_ok = template_engine.recognize(binary) == code
+            library.record_check(tesseract_ok, template_ok)
+            checked, tesseract_correct, template_correct = library.checks
+            print(f"验证码留出检验 {checked} 次：Tesseract 答对 {tesseract_correct} 次，模板匹配答对 {template_correct} 次。")
+        except Exception as e:
+            print(f"验证码留出检验出错: {e}")
+    if library.learn(binary, code):
+        library.save()
+
+
+# --- 识别后端对比 ---
+def benchmark(sample_dir):
+    """在已标注样本（文件名前5位即答案）上对比各后端、各候选数的速度与成功率；模板库用前一半样本训练、后一半测试。
+    每张都经过 recognize()（含预检和投票），与实际登录时的识别过程相同"""
+    from PIL import Image
+
+    paths = sorted(glob.glob(os.path.join(sample_dir, '*.png')))
+    samples = [(Image.open(path), os.path.basename(path)[:CAPTCHA_LENGTH]) for path in paths]
+    if len(samples) < 2:
+        print(f"{sample_dir} 中的已标注样本不足。")
+        return
+    train, test = samples[:len(samples) // 2], samples[len(samples) // 2:]
+    library = GlyphLibrary(path=None)
+    for image, code in train:
+        library.learn(preprocess(image), code)
+
+    for engine in (get_tesseract_engine(), TemplateEngine(library)):
+        for count in BENCHMARK_VARIANTS:
+            correct = 0
+            start = time.perf_counter()
+            for image, code in test:
+                with redirect_stdout(StringIO()):  # 不打印每一张的识别结果
+                    correct += recognize(image, engine, count) == code
+            elapsed_ms = (time.perf_counter() - start) / len(test) * 1000
+            print(f"{engine.name:<12} {count} 组候选 平均 {elapsed_ms:7.2f} ms/张，"
+                  f"成功率 {correct / len(test):.0%}（{correct}/{len(test)}）")
+
+
+if __name__ == "__main__":
+    # 用法: python captcha_solver.py <已标注验证码目录>
+    if len(sys.argv) != 2:
+        print("用法: python captcha_solver.py <已标注验证码目录>")
+        sys.exit(1)
+    benchmark(sys.argv[1])
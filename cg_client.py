@@ -0,0 +1,359 @@
+import contextvars
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util import Retry, make_headers
+
+from fetch_cache import fingerprint
+from history_archive import history_fragment
+from homework_diff import needs_detail
+from homework_store import homework_id
+from html_extract import DEFAULT_BACKEND, extract_active_assignments, extract_courses, extract_current_homework, \
+    extract_history_homework
+from metrics import metrics
+
+# --- 希冀平台客户端 ---
+# CGDDLHelper（未完成作业邮件）和 CGOnlineHWNotifier（新作业提醒）共用：一个已登录会话，
+# 一次课程遍历同时取回作业页（当前/历史作业）、在线作业页（截止时间、补交状态）和可选的作业详情页（是否完成），
+# 合并成统一的 HomeworkRecord，两个前端各取所需
+BASE_URL = "https://cslabcg.whu.edu.cn"
+LOGIN_URL = f"{BASE_URL}/login/loginproc.jsp"
+CAPTCHA_URL = f"{BASE_URL}/cgjiaoyan"
+MAIN_URL = f"{BASE_URL}/main.jsp"
+HOMEWORK_PAGE_URL = f"{BASE_URL}/includes/redirect.jsp?tab=-2"
+ACTIVE_ASSIGNS_URL = f"{BASE_URL}/assignment/mainActiveAssigns.jsp"
+LOGIN_PAGE_MARKER = '/indexcs/simple.jsp'  # 会话过期时会被重定向到的登录页
+COURSE_LIST_MARKER = "选择课程"  # 课程选择页（登录成功后的页面）
+COURSE_WORKERS = 2    # 并行遍历课程的会话数（包括账号会话），每个会话都单独登录
+DETAIL_WORKERS = 8    # 每个课程并发获取作业详情页的最大线程数
+# 选课请求改变的是服务器端会话（JSESSIONID）的状态，同一个服务器会话上不能同时选中两门课程。
+# 并行遍历时每个线程使用一个单独登录（各有自己的 JSESSIONID）的会话，在这个会话上依次扫描分到的课程；
+# 详情页只依赖作业链接，可以在选中课程后并发获取
+
+# --- 连接池、超时与重试 ---
+# 所有平台会话（各账号的会话、coordinator.py 工作进程的会话）共用一个 HTTPAdapter，keep-alive 连接跨会话、跨轮次复用，
+# 新会话不再各自重新建立 TLS 连接。连接失败、读超时和 429/5xx 只对 GET 按指数退避重试；
+# POST（登录）只在连接尚未建立时重试，不会重复提交。
+# 全局限速在适配器上执行：每个真正发出的请求（包括重定向的每一跳和每次重试）都先申请一个令牌
+CONNECT_TIMEOUT = 5   # 建立连接的超时时间（秒）
+READ_TIMEOUT = 15     # 等待响应数据的超时时间（秒）
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+POOL_SIZE = COURSE_WORKERS * DETAIL_WORKERS  # 连接池保留的最大连接数，即遍历时的最大并发请求数
+RETRIES = 3           # 单个请求的最多重试次数
+RETRY_BACKOFF = 0.5   # 退避基数（秒）：第 n 次重试前等待 RETRY_BACKOFF * 2^(n-1)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']  # gzip/deflate，安装了 brotli 时包含 br
+
+# 登录结果
+LOGIN_OK = 'ok'
+LOGIN_BAD_PASSWORD = 'bad_password'
+LOGIN_BAD_CAPTCHA = 'bad_captcha'
+LOGIN_UNKNOWN = 'unknown'
+
+session_hooks = []  # 每个新会话创建后依次调用，例如 replay.py 挂载录制/回放适配器、metrics 统计请求
+
+# 一条作业：is_active 表示出现在在线作业页（有截止时间和补交状态），is_history 表示来自历史作业区块，
+# is_completed 只有在遍历时开启了 check_completion 才会填写，否则为 None；
+# is_new 表示出现在作业页“当前作业”中且不在 known_ids 里，detail_checked 表示 is_completed 来自本次请求的详情页
+HomeworkRecord = namedtuple('HomeworkRecord', ['account', 'course', 'title', 'link', 'due_time', 'is_completed',
+                                               'is_late_submission', 'is_active', 'is_history', 'is_new',
+                                               'detail_checked'])
+# 一个课程的遍历结果：unchanged 表示作业页与上次相同（跳过了解析），error 为遍历时的异常
+CourseResult = namedtuple('CourseResult', ['course', 'link', 'records', 'unchanged', 'error'])
+
+
+_rate_limiter = None  # set_rate_limiter() 设置的令牌桶（RateLimiter 或跨进程的 SharedRateLimiter），None 时不限速
+
+
+def set_rate_limiter(limiter):
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def acquire_token():
+    """发出一个请求前调用；未设置限速时直接返回"""
+    limiter = _rate_limiter
+    if limiter is not None:
+        limiter.acquire()
+
+
+class LoggedRetry(Retry):
+    """每次重试时打印原因和退避时间，并计入 metrics 的 http_retries；重试发出前同样申请限速令牌"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        reason = type(error).__name__ if error is not None else f"HTTP {response.status}"
+        try:
+            retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        except MaxRetryError:
+            print(f"请求 {method} {url} 失败（{reason}），重试次数已用完。")
+            metrics.incr('http_retries_exhausted')
+            raise
+        metrics.incr('http_retries')
+        print(f"请求 {method} {url} 失败（{reason}），{retry.get_backoff_time():.1f} 秒后第 {len(retry.history)} 次重试...")
+        acquire_token()
+        return retry
+
+
+class PlatformAdapter(HTTPAdapter):
+    """调用方没有传入 timeout 的请求使用默认超时，单个请求不会无限期挂起；
+    requests 跟随重定向时每一跳都经过 send()，所以每一跳都受全局限速约束"""
+
+    def __init__(self, timeout=REQUEST_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def send(self, request, timeout=None, **kwargs):
+        acquire_token()
+        return super().send(request, timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def configure_transport(pool_size=POOL_SIZE, retries=RETRIES, backoff=RETRY_BACKOFF, timeout=REQUEST_TIMEOUT):
+    """替换共享的连接池和重试策略，之后新建的会话生效"""
+    global _transport
+    retry = LoggedRetry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                        allowed_methods=frozenset({'GET'}), raise_on_status=False)
+    with _transport_lock:
+        _transport = PlatformAdapter(timeout, pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        return _transport
+
+
+def transport():
+    with _transport_lock:
+        if _transport is not None:
+            return _transport
+    return configure_transport()
+
+
+def apply_session_hooks(session):
+    for hook in session_hooks:
+        hook(session)
+    return session
+
+
+def prepare_session(session):
+    """挂载共享的连接池、声明可接受的压缩格式，再依次调用 session_hooks"""
+    adapter = transport()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    return apply_session_hooks(session)
+
+
+def new_session():
+    return prepare_session(requests.Session())
+
+
+def absolute_link(href):
+    return href if href.startswith("http") else f"{BASE_URL}/{href}"
+
+
+def login_status(html):
+    if "用户名或者密码错误！" in html:
+        return LOGIN_BAD_PASSWORD
+    if "验证码错误！" in html:
+        return LOGIN_BAD_CAPTCHA
+    if COURSE_LIST_MARKER in html:  # 登录成功后的页面是课程选择页
+        return LOGIN_OK
+    return LOGIN_UNKNOWN
+
+
+def check_assignment_completion(url, worker_session, timeout=REQUEST_TIMEOUT):
+    """作业详情页中没有“未提交”即视为已完成；请求出错时返回 None"""
+    try:
+        with metrics.span('detail_fetch'):
+            response = worker_session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return "未提交" not in response.text
+    except requests.RequestException as e:
+        print(f"请求出错: {e}")
+        return None
+
+
+class CGClient:
+    """一个账号的平台会话；session_factory 用于创建会话"""
+
+    def __init__(self, stid, pwd, session_factory=new_session, timeout=REQUEST_TIMEOUT):
+        self.stid = stid
+        self.pwd = pwd
+        self.session_factory = session_factory
+        self.timeout = timeout
+        self.session = session_factory()
+
+    # --- 登录 ---
+    def fetch_captcha(self):
+        with metrics.span('captcha_fetch'):
+            response = self.session.get(CAPTCHA_URL, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def login(self, captcha_code):
+        """返回 (登录结果, 响应)；登录成功时响应即课程选择页"""
+        login_data = {"stid": self.stid, "pwd": self.pwd, "captchaCode": captcha_code}
+        with metrics.span('login_post'):
+            response = self.session.post(LOGIN_URL, data=login_data, timeout=self.timeout)
+        response.raise_for_status()
+        return login_status(response.text), response
+
+    def probe_session(self):
+        """用一次轻量 GET 探测会话是否仍然有效：过期时服务器会重定向回登录页。
+        有效时返回探测到的页面（尚未选课时就是课程选择页），无效时返回 None"""
+        if not self.session.cookies:
+            return None
+        try:
+            response = self.session.get(MAIN_URL, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"会话探测请求失败: {e}")
+            return None
+        if LOGIN_PAGE_MARKER in response.url or "captchaCode" in response.text:
+            return None
+        return response.text
+
+    def is_session_alive(self):
+        return self.probe_session() is not None
+
+    # --- 课程遍历 ---
+    def scan_course(self, course_name, course_link, worker_session, known_ids=frozenset(), cache=None,
+                    use_cache=True, include_history=False, fetch_active=True, check_completion=False,
+                    detail_workers=DETAIL_WORKERS, html_backend=DEFAULT_BACKEND, snapshots=None,
+                    history_archive=None, fetch_homework_page=True):
+        """选中课程后依次获取作业页和在线作业页（同一会话中按顺序完成），合并成 HomeworkRecord 列表
+        作业页的当前作业片段与上次相同时不再解析它，只保留在线作业页中的记录；
+        提供 snapshots（作业ID -> homework_diff.Snapshot）时，只为列表指纹变化或需要复查的作业请求详情页；
+        提供 history_archive 时历史作业同步到归档，只返回新归档的历史作业；
+        fetch_homework_page 为 False 时只请求在线作业页（只需要截止时间和完成情况的调用方，如 CGDDLHelper），
+        此时没有当前作业和历史作业，也不判断新作业"""
+        hw_page_res = None
+        with metrics.span('course_fetch'):
+            worker_session.get(course_link, timeout=self.timeout)
+            if fetch_homework_page:
+                worker_session.get(MAIN_URL, timeout=self.timeout)
+                # 所有课程的作业页 URL 相同，缓存按课程链接区分
+                headers = cache.conditional_headers(course_link) if cache is not None and use_cache else {}
+                hw_page_res = worker_session.get(HOMEWORK_PAGE_URL, headers=headers, timeout=self.timeout)
+                hw_page_res.raise_for_status()
+            active_res = worker_session.get(ACTIVE_ASSIGNS_URL, timeout=self.timeout) if fetch_active else None
+        unchanged = hw_page_res is not None and cache is not None and cache.check(course_link, hw_page_res) \
+            and use_cache
+
+        fields = {}  # 作业链接 -> 记录字段，保持页面中的顺序
+        listed = set()  # 作业页“当前作业”中出现的链接，只有它们参与新作业判断（与原有提醒逻辑一致）
+
+        def add(title, href, **values):
+            link = absolute_link(href)
+            entry = fields.setdefault(link, {
+                'account': self.stid, 'course': course_name, 'title': title, 'link': link, 'due_time': None,
+                'is_completed': None, 'is_late_submission': None, 'is_active': False, 'is_history': False,
+                'detail_checked': False})
+            entry.update(values)
+
+        if hw_page_res is not None and not unchanged:
+            with metrics.span('parse'):
+                current = extract_current_homework(hw_page_res.text, html_backend)
+            for title, href in current or []:
+                add(title, href)
+                listed.add(absolute_link(href))
+        if active_res is not None:
+            active_res.raise_for_status()
+            with metrics.span('parse'):
+                active = extract_active_assignments(active_res.content, html_backend)
+            for item in active:
+                add(item['name'], item['href'], due_time=item['due_time'],
+                    is_late_submission=item['is_late_submission'], is_active=True)
+        include_history = include_history and hw_page_res is not None
+        if include_history and history_archive is not None:
+            # 整页 304 或历史区块（没有历史作业时为空）与归档中的指纹相同时不解析；
+            # 有历史标题却截取不到区块时完整解析，不依赖指纹
+            history_changed = False
+            if hw_page_res.status_code != 304:
+                fragment = history_fragment(hw_page_res.text)
+                digest = fingerprint(fragment) if fragment is not None else ''
+                history_changed = fragment is None or digest != history_archive.fingerprint(self.stid, course_name)
+            if history_changed:
+                with metrics.span('parse'):
+                    history = extract_history_homework(hw_page_res.text)
+                items = [(title, absolute_link(href)) for title, href in history]
+                for title, link in history_archive.sync(self.stid, course_name, digest, items):
+                    if link not in fields:
+                        add(title, link, is_history=True)
+        elif include_history and not unchanged:
+            with metrics.span('parse'):
+                history = extract_history_homework(hw_page_res.text)
+            for title, href in history:
+                if absolute_link(href) not in fields:
+                    add(title, href, is_history=True)
+
+        if check_completion:
+            # 详情页请求彼此独立，用有界线程池并发获取，map 保证结果顺序与作业顺序一致
+            pending = []
+            for entry in fields.values():
+                if entry['is_history']:
+                    continue
+                previous = snapshots.get(homework_id(course_name, entry['title'])) if snapshots is not None else None
+                if snapshots is None or needs_detail(previous, entry['title'], entry['link'], entry['due_time'],
+                                                     entry['is_late_submission']):
+                    pending.append(entry)
+                else:
+                    entry['is_completed'] = previous.is_completed  # 列表没有变化，沿用上次的完成情况
+            urls = [entry['link'] for entry in pending]
+            check = lambda url: check_assignment_completion(url, worker_session, self.timeout)
+            if detail_workers <= 1 or len(urls) <= 1:
+                results = [check(url) for url in urls]
+            else:
+                # 每个详情页请求带上调用方上下文的副本，metrics 按账号记录
+                contexts = [contextvars.copy_context() for _ in urls]
+                with ThreadPoolExecutor(max_workers=min(detail_workers, len(urls))) as executor:
+                    results = list(executor.map(lambda context, url: context.run(check, url), contexts, urls))
+            for entry, is_completed in zip(pending, results):
+                entry['is_completed'] = is_completed
+                entry['detail_checked'] = is_completed is not None
+
+        records = [HomeworkRecord(is_new=link in listed and homework_id(course_name, entry['title']) not in known_ids,
+                                  **entry)
+                   for link, entry in fields.items()]
+        return CourseResult(course_name, course_link, records, unchanged, None)
+
+    def course_entries(self, course_page_html, html_backend=DEFAULT_BACKEND):
+        """课程选择页 -> [(课程名, 选课链接)]"""
+        with metrics.span('parse'):
+            courses = extract_courses(course_page_html, html_backend)
+        return [(course_name, f"{BASE_URL}/{href}") for course_name, href in courses]
+
+    def walk(self, course_entries, sessions=None, **options):
+        """遍历所有课程；sessions 为各自单独登录的会话（缺省只用账号会话），每个会话一个线程，依次取下一门课程扫描。
+        结果按课程顺序返回，单个课程出错不影响其他课程；options 传给 scan_course"""
+        sessions = sessions or [self.session]
+        pending = queue.Queue()
+        for index, entry in enumerate(course_entries):
+            pending.put((index, entry))
+        results = [None] * len(course_entries)
+
+        def drain(session):
+            while True:
+                try:
+                    index, (course_name, course_link) = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = self.scan_course(course_name, course_link, session, **options)
+                except Exception as e:
+                    results[index] = CourseResult(course_name, course_link, [], False, e)
+
+        sessions = sessions[:len(course_entries)]
+        if len(sessions) <= 1:
+            drain(self.session if not sessions else sessions[0])
+            return results
+        # 每个线程带上调用方上下文的副本，metrics 按账号记录
+        contexts = [contextvars.copy_context() for _ in sessions]
+        with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+            list(executor.map(lambda context, session: context.run(drain, session), contexts, sessions))
+        return results
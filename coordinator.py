@@ -0,0 +1,229 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import requests
+
+import CGOnlineHWNotifier as notifier
+import cg_client
+from cg_client import HomeworkRecord
+from homework_diff import CHANGE_LABELS, NEW, Snapshot, changed_keys, describe, diff, snapshots_from_rows
+from homework_store import HOMEWORK_DB_FILE, HomeworkStore, homework_id
+from html_extract import DEFAULT_BACKEND
+from job_queue import open_queue
+from notify_dispatch import Alert
+from rate_limit import DEFAULT_RATE, SharedRateLimiter
+
+# --- 协调进程 / 工作进程模式 ---
+# 适用于同时监控很多账号（如整个班级）。协调进程按轮次为每个账号下发“登录”任务，登录成功后为每门课程下发“扫描”任务；
+# 多个工作进程并行执行任务，验证码 OCR 和页面解析分布在多个 CPU 核上，所有进程共用一个跨进程令牌桶限速。
+# 协调进程持有已知作业和作业快照，是唯一写作业数据库和发送提醒的进程：收齐一个账号所有课程的结果后保存、比较、提醒。
+# 工作进程不需要手动输入，自动登录失败的账号等到下一轮再试。用法：
+#   python coordinator.py --workers 4
+#   python coordinator.py --workers 4 --once     # 每个账号检查一轮后退出
+LOGIN_JOB = 'login'
+COURSE_JOB = 'course'
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+IDLE_SLEEP = 0.05  # 队列中没有任务或结果时的等待时间（秒）
+
+
+# --- 工作进程 ---
+class LoginFailed(Exception):
+    pass
+
+
+def run_login_job(account, html_backend):
+    """复用仍然有效的会话，否则识别验证码登录；返回课程列表和会话 cookies，供课程任务使用"""
+    response = notifier.ensure_login(account)
+    if not response:
+        raise LoginFailed("自动登录失败")
+    return {'courses': account.client.course_entries(response.text, html_backend),
+            'cookies': requests.utils.dict_from_cookiejar(account.session.cookies)}
+
+
+def run_course_job(account, payload, config):
+    """用任务中的 cookies 建立工作会话，扫描一门课程；已知作业和快照由协调进程随任务下发"""
+    session = account.client.session_factory()
+    session.headers.update(account.session.headers)
+    session.cookies.update(payload['cookies'])
+    snapshots = {fields[0]: Snapshot(*fields) for fields in payload['snapshots']}
+    result = account.client.scan_course(
+        payload['course'], payload['link'], session, known_ids=set(payload['known_ids']), cache=None,
+        fetch_active=config.get('fetch_due_times', True), check_completion=config.get('track_completion', True),
+        html_backend=config.get('html_backend', DEFAULT_BACKEND), snapshots=snapshots)
+    return {'records': [record._asdict() for record in result.records]}
+
+
+def worker_main(config, limiter, stop, name):
+    """工作进程入口：与 CGOnlineHWNotifier.main() 相同地应用配置，换用跨进程限速，然后循环执行任务"""
+    notifier.apply_config(config)
+    notifier.platform_limiter = limiter
+    cg_client.set_rate_limiter(limiter)
+    queue = open_queue(config)
+    accounts = {account.stid: account for account in notifier.load_accounts(config)}
+    html_backend = config.get('html_backend', DEFAULT_BACKEND)
+    try:
+        while not stop.is_set():
+            job = queue.claim(name)
+            if job is None:
+                time.sleep(IDLE_SLEEP)
+                continue
+            account = accounts[job.account]
+            try:
+                if job.kind == LOGIN_JOB:
+                    result = run_login_job(account, html_backend)
+                else:
+                    result = run_course_job(account, job.payload, config)
+            except Exception as e:
+                print(f"[{name}] [{job.account}] {job.kind} 任务失败（第 {job.attempts} 次）: {e}")
+                queue.fail(job.id, e)
+            else:
+                queue.complete(job.id, result)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+
+# --- 协调进程 ---
+class AccountState:
+    """协调进程中一个账号的状态：已知作业、快照，以及当前一轮还在等待的课程任务"""
+
+    def __init__(self, account, store):
+        self.account = account
+        self.known = notifier.load_known_homework(store, account)
+        self.first_scan = not self.known  # 首次扫描时已经存在的作业 first_seen 记为 0，不参与发布时段统计
+        self.snapshots = snapshots_from_rows(store.records(account.stid))
+        self.next_run = 0.0
+        self.active = False
+        self.outstanding = 0
+        self.records = []
+        self.rounds = 0
+        self.ok = True
+
+
+def start_courses(queue, state, result):
+    courses = result['courses']
+    if not courses:
+        print(f"[{state.account.stid}] 错误：登录成功但未在页面中找到任何课程。")
+    for course, link in courses:
+        ids = [key for key in state.known if key.startswith(f"{course}::")]
+        snapshots = [list(snapshot) for snapshot in state.snapshots.values() if snapshot.course == course]
+        queue.put(COURSE_JOB, state.account.stid, {'course': course, 'link': link, 'cookies': result['cookies'],
+                                                   'known_ids': ids, 'snapshots': snapshots})
+    state.outstanding = len(courses)
+
+
+def finish_round(state, store, dispatcher, ok, interval):
+    """一个账号的所有课程都有结果后：保存、提醒新作业和作业变化，安排下一轮"""
+    stid = state.account.stid
+    records = [record for record in state.records if not record.is_history]
+    previous = state.snapshots
+    changes, state.snapshots = diff(previous, records)
+    changed = changed_keys(previous, state.snapshots)
+    dirty = [record for record in records if record.is_new or homework_id(record.course, record.title) in changed]
+    if dirty:
+        extra = {'notified': True, 'first_seen': 0} if state.first_scan else {'notified': True}
+        store.upsert({**record._asdict(), **extra} for record in dirty)
+    new_items = [record for record in records if record.is_new]
+    for record in new_items:
+        print(f"🚨 [{stid}] 发现新作业! 课程: {record.course} 作业: {record.title}")
+        dispatcher.submit(Alert(stid, record.course, record.title))
+        state.known.add(homework_id(record.course, record.title))
+    changes = [change for change in changes if change.kind != NEW]  # 新作业按 is_new 提醒，与单进程模式一致
+    for change in changes:
+        print(f"[{stid}] 【{CHANGE_LABELS[change.kind]}】{change.course}：{change.title}（{describe(change)}）")
+        if state.account.config.get('notify_changes', True):
+            dispatcher.submit(Alert(stid, change.course, change.title, change.kind, describe(change)))
+    print(f"[{stid}] 第 {state.rounds + 1} 轮完成：{len(records)} 个作业，{len(new_items)} 个新作业，"
+          f"{len(changes)} 项变化。")
+    state.records = []
+    state.first_scan = state.first_scan and not ok
+    state.active = False
+    state.ok = ok
+    state.rounds += 1
+    state.next_run = time.time() + interval
+
+
+def coordinate(config, queue, store, dispatcher, once=False):
+    """下发任务、收集结果；once 为 True 时每个账号完成一轮后返回是否全部成功"""
+    interval = config.get('worker_interval', notifier.SLOW_CHECK_INTERVAL)
+    states = {account.stid: AccountState(account, store) for account in notifier.load_accounts(config)}
+    while True:
+        now = time.time()
+        for stid, state in states.items():
+            if not state.active and now >= state.next_run and not (once and state.rounds):
+                queue.put(LOGIN_JOB, stid, {})
+                state.active = True
+                state.ok = True
+
+        for job in queue.finished():
+            state = states[job.account]
+            if job.kind == LOGIN_JOB:
+                if job.state == 'done':
+                    start_courses(queue, state, job.result)
+                    if state.outstanding:
+                        continue
+                else:
+                    print(f"[{job.account}] 自动登录连续失败（{job.error}），下一轮再试。")
+                finish_round(state, store, dispatcher, job.state == 'done', interval)
+                continue
+            if job.state == 'done':
+                state.records.extend(HomeworkRecord(**fields) for fields in job.result['records'])
+            else:
+                print(f"[{job.account}] 扫描课程《{job.payload['course']}》失败: {job.error}")
+                state.ok = False
+            state.outstanding -= 1
+            if state.outstanding == 0:
+                finish_round(state, store, dispatcher, state.ok, interval)
+
+        if once and all(state.rounds for state in states.values()):
+            return all(state.ok for state in states.values())
+        time.sleep(IDLE_SLEEP)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程监控多个账号：协调进程下发任务，工作进程登录和扫描")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="工作进程数")
+    parser.add_argument('--once', action='store_true', help="每个账号检查一轮后退出，有账号失败时退出码为 1")
+    args = parser.parse_args(argv)
+
+    config = notifier.get_config()
+    # 指标按“账号的一轮检查”统计，而这里一轮分散在多个进程中，各进程还会互相覆盖同一个 Prometheus 文件，
+    # 所以此模式不记录指标（工作进程拿到的也是这份配置）
+    if config.get('metrics_jsonl') or config.get('metrics_prom'):
+        print("提示：多进程模式不记录指标，已忽略 metrics_jsonl / metrics_prom。")
+    config = {**config, 'metrics_jsonl': None, 'metrics_prom': None}
+    notifier.apply_config(config)
+    limiter = SharedRateLimiter(config.get('max_requests_per_second', DEFAULT_RATE))
+    queue = open_queue(config)
+    queue.clear()
+    store = HomeworkStore(config.get('homework_db', HOMEWORK_DB_FILE))
+    dispatcher = notifier.create_dispatcher(config)
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=worker_main, args=(config, limiter, stop, f"worker-{i + 1}"),
+                                       name=f"worker-{i + 1}", daemon=True)
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    print(f"--- 协调进程已启动：{args.workers} 个工作进程，限速 {limiter.rate} 次/秒 ---")
+
+    ok = False
+    try:
+        ok = coordinate(config, queue, store, dispatcher, args.once)
+    except KeyboardInterrupt:
+        print("已退出。")
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(10)
+        dispatcher.close()
+        store.close()
+        queue.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+# --- 条件请求与页面指纹缓存 ---
+FETCH_CACHE_FILE = 'fetch_cache.json'
+
+_DIV_TAG_RE = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+_CLASS_ATTR_RE = re.compile(r'''class\s*=\s*["']([^"']*)["']''', re.IGNORECASE)
+
+
+def extract_fragment(html, class_names=('list-group-flush', 'mb-4')):
+    """不构建 DOM 树，直接从原始 HTML 中截取第一个带有全部指定 class 的 div 片段"""
+    depth = 0
+    start = None
+    for match in _DIV_TAG_RE.finditer(html):
+        is_closing = match.group(1) == '/'
+        if start is None:
+            if is_closing:
+                continue
+            class_attr = _CLASS_ATTR_RE.search(match.group(0))
+            classes = class_attr.group(1).split() if class_attr else []
+            if all(name in classes for name in class_names):
+                start = match.start()
+                depth = 1
+        elif is_closing:
+            depth -= 1
+            if depth == 0:
+                return html[start:match.end()]
+        else:
+            depth += 1
+    return html[start:] if start is not None else ''
+
+
+def extract_div(html, pos=0):
+    """从 pos 之后的第一个 div 开始，截取这个 div 的完整片段（含嵌套的 div），没有 div 时返回空字符串"""
+    depth = 0
+    start = None
+    for match in _DIV_TAG_RE.finditer(html, pos):
+        if start is None:
+            if match.group(1) == '/':
+                continue
+            start = match.start()
+            depth = 1
+        elif match.group(1) == '/':
+            depth -= 1
+            if depth == 0:
+                return html[start:match.end()]
+        else:
+            depth += 1
+    return html[start:] if start is not None else ''
+
+
+def fingerprint(fragment):
+    return hashlib.sha256(fragment.encode('utf-8')).hexdigest()
+
+
+class FetchCache:
+    """按 key（课程+URL）保存 ETag/Last-Modified 和关键片段的指纹，并统计命中情况"""
+
+    def __init__(self, path=FETCH_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                self.entries = {}
+
+    def conditional_headers(self, key):
+        entry = self.entries.get(key, {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def check(self, key, response, class_names=('list-group-flush', 'mb-4')):
+        """记录响应的验证器，返回页面是否与上次相同（304 或关键片段指纹一致）"""
+        with self._lock:
+            if response.status_code == 304:
+                self.hits += 1
+                return True
+            entry = self.entries.setdefault(key, {})
+            entry['etag'] = response.headers.get('ETag')
+            entry['last_modified'] = response.headers.get('Last-Modified')
+            digest = fingerprint(extract_fragment(response.text, class_names))
+            unchanged = entry.get('fingerprint') == digest
+            entry['fingerprint'] = digest
+            if unchanged:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return unchanged
+
+    def invalidate(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"页面缓存命中 {self.hits} 次，未命中 {self.misses} 次（命中率 {rate:.0%}）"
@@ -0,0 +1,156 @@
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from fetch_cache import extract_div
+
+# --- 历史作业归档 ---
+# 每个账号每门课程一行：历史作业列表（标题、链接、归档时间）压缩后存为一个 BLOB，另存历史区块的指纹和条数。
+# 遍历时先对作业页中的历史区块取指纹，与归档中的相同就不再解析；不同时只把还没归档的作业追加进去。
+# 启动时不再完整解析和打印所有历史作业，开销与历史学期数无关；查看历史作业用本文件的命令行，不需要登录：
+#   python history_archive.py                    # 各课程的历史作业条数
+#   python history_archive.py 实验 --course 操作系统
+HISTORY_ARCHIVE_FILE = 'history_archive.db'
+HISTORY_HEADER = '历史作业'
+_H5_RE = re.compile(r'<h5\b[^>]*>(.*?)</h5\s*>', re.IGNORECASE | re.DOTALL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    account     TEXT NOT NULL,
+    course      TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    count       INTEGER NOT NULL,
+    entries     BLOB NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (account, course)
+);
+"""
+
+
+def history_fragment(html):
+    """作业页中历史作业区块的原始 HTML，与 html_extract.extract_history_homework 定位方式相同：
+    标题含“历史作业”的 h5 之后的第一个 div（不限 class）；有多个历史标题时依次拼接。
+    没有历史标题时返回空字符串（同样可以作为指纹），有标题却截取不到 div 时返回 None"""
+    fragments = []
+    for match in _H5_RE.finditer(html):
+        if '<strong' in match.group(1) and HISTORY_HEADER in match.group(1):
+            fragment = extract_div(html, match.end())
+            if not fragment:
+                return None
+            fragments.append(fragment)
+    return ''.join(fragments)
+
+
+def _pack(entries):
+    return zlib.compress(json.dumps(entries, ensure_ascii=False).encode('utf-8'), 9)
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class HistoryArchive:
+    """可在多个线程中共用（遍历课程的线程各自同步自己的课程）"""
+
+    def __init__(self, path=HISTORY_ARCHIVE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def fingerprint(self, account, course):
+        """上次同步时历史区块的指纹，没有归档时返回 None"""
+        with self._lock:
+            row = self._conn.execute('SELECT fingerprint FROM history WHERE account = ? AND course = ?',
+                                     (account, course)).fetchone()
+        return row['fingerprint'] if row else None
+
+    def sync(self, account, course, digest, items):
+        """items: [(标题, 链接)]；只追加还没归档的作业，返回新归档的 [(标题, 链接)]"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT entries FROM history WHERE account = ? AND course = ?',
+                                     (account, course)).fetchone()
+            entries = _unpack(row['entries']) if row else []
+            archived = {link for _, link, _ in entries}
+            added = []
+            for title, link in items:
+                if link not in archived:
+                    archived.add(link)
+                    added.append((title, link))
+            entries.extend([title, link, now] for title, link in added)
+            self._conn.execute(
+                'INSERT INTO history (account, course, fingerprint, count, entries, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (account, course) DO UPDATE SET '
+                'fingerprint = excluded.fingerprint, count = excluded.count, entries = excluded.entries, '
+                'updated_at = excluded.updated_at',
+                (account, course, digest, len(entries), _pack(entries), now))
+        return added
+
+    def counts(self, account=None):
+        """[(账号, 课程, 条数)]，不需要解压"""
+        sql = 'SELECT account, course, count FROM history'
+        params = []
+        if account is not None:
+            sql += ' WHERE account = ?'
+            params.append(account)
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(sql + ' ORDER BY account, course', params)]
+
+    def query(self, keyword=None, course=None, account=None):
+        """按标题关键字、课程名（子串）、账号筛选，返回 [(账号, 课程, 标题, 链接, 归档时间)]"""
+        sql = 'SELECT account, course, entries FROM history WHERE 1 = 1'
+        params = []
+        if account is not None:
+            sql += ' AND account = ?'
+            params.append(account)
+        if course:
+            sql += ' AND instr(course, ?) > 0'
+            params.append(course)
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY account, course', params).fetchall()
+        results = []
+        for row in rows:
+            for title, link, archived_at in _unpack(row['entries']):
+                if not keyword or keyword in title:
+                    results.append((row['account'], row['course'], title, link, archived_at))
+        return results
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询本地归档的历史作业（不需要登录）")
+    parser.add_argument('keyword', nargs='?', help="标题关键字；不提供关键字和课程时只列出各课程的条数")
+    parser.add_argument('--course', help="课程名（子串匹配）")
+    parser.add_argument('--account', help="学号")
+    parser.add_argument('--db', default=HISTORY_ARCHIVE_FILE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    archive = HistoryArchive(args.db)
+    try:
+        if not args.keyword and not args.course:
+            rows = archive.counts(args.account)
+            for account, course, count in rows:
+                print(f"[{account}] {course}：{count} 条")
+        else:
+            rows = archive.query(args.keyword, args.course, args.account)
+            for account, course, title, link, archived_at in rows:
+                print(f"[{account}] {course} - {title} 链接：{link}  "
+                      f"（归档于 {time.strftime('%Y-%m-%d', time.localtime(archived_at))}）")
+    finally:
+        archive.close()
+    print(f"共 {len(rows)} 条，耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import hashlib
+import time
+from collections import namedtuple
+
+from homework_store import homework_id
+
+# --- 作业快照与变化检测 ---
+# 每条作业保留一份快照：列表页上能看到的字段（标题、链接、截止时间、补交状态）合成一个列表指纹，
+# 完成情况来自作业详情页。相邻两次快照先比较指纹和完成情况，相同则直接跳过，不同时才逐字段比较并产生变化事件。
+# 遍历时列表指纹没变、完成情况已知的作业不再请求详情页（未完成的作业每隔 DETAIL_RECHECK_INTERVAL 复查一次）
+NEW = 'new'
+DEADLINE_CHANGED = 'deadline_changed'
+COMPLETED = 'completed'
+ENTERED_LATE = 'entered_late'
+CHANGE_LABELS = {NEW: '新作业', DEADLINE_CHANGED: '截止时间变更', COMPLETED: '已完成', ENTERED_LATE: '进入补交'}
+DETAIL_RECHECK_INTERVAL = 3600  # 列表指纹不变的未完成作业，详情页最多每隔这么久（秒）复查一次
+
+# is_late_submission / is_completed 为 None 表示还不知道；checked_at 为上次请求详情页的时间（从数据库加载时为 0）
+Snapshot = namedtuple('Snapshot', ['key', 'course', 'title', 'link', 'due_time', 'is_late_submission', 'is_completed',
+                                   'list_hash', 'checked_at'])
+# 一个变化事件：old/new 为变化前后的值（NEW 事件为 None 和截止时间）
+Change = namedtuple('Change', ['kind', 'key', 'course', 'title', 'old', 'new'])
+
+
+def list_fingerprint(title, link, due_time, is_late_submission):
+    text = '\x1f'.join(str(value) for value in (title, link, due_time, is_late_submission))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _flag(value):
+    """数据库中的 0/1 与页面上的 True/False 统一为布尔值，None 保持不变"""
+    return None if value is None else bool(value)
+
+
+def merge(previous, record, checked_at=None):
+    """用本次扫描到的字段更新快照；record 为 HomeworkRecord 或数据库行字典，值为 None 的字段沿用上一份快照。
+    checked_at 为 None 表示本次没有请求详情页"""
+    get = record.get if isinstance(record, dict) else lambda name: getattr(record, name)
+
+    def pick(name, value):
+        return getattr(previous, name) if value is None and previous is not None else value
+
+    link = pick('link', get('link'))
+    due_time = pick('due_time', get('due_time'))
+    is_late_submission = pick('is_late_submission', _flag(get('is_late_submission')))
+    is_completed = pick('is_completed', _flag(get('is_completed')))
+    if checked_at is None:
+        checked_at = previous.checked_at if previous is not None else 0
+    return Snapshot(homework_id(get('course'), get('title')), get('course'), get('title'), link, due_time,
+                    is_late_submission, is_completed, list_fingerprint(get('title'), link, due_time, is_late_submission),
+                    checked_at)
+
+
+def snapshots_from_rows(rows):
+    """数据库中的作业行 -> {作业ID: Snapshot}，程序重启后从上次的状态继续比较"""
+    snapshots = {}
+    for row in rows:
+        snapshot = merge(None, row)
+        snapshots[snapshot.key] = snapshot
+    return snapshots
+
+
+def needs_detail(previous, title, link, due_time, is_late_submission, now=None,
+                 recheck_interval=DETAIL_RECHECK_INTERVAL):
+    """遍历时判断是否需要请求作业详情页：新作业、完成情况未知、列表指纹变化，或未完成且超过复查间隔"""
+    if previous is None or previous.is_completed is None:
+        return True
+    due_time = previous.due_time if due_time is None else due_time
+    is_late_submission = previous.is_late_submission if is_late_submission is None else is_late_submission
+    if list_fingerprint(title, previous.link if link is None else link, due_time, is_late_submission) \
+            != previous.list_hash:
+        return True
+    now = time.time() if now is None else now
+    return not previous.is_completed and now - previous.checked_at >= recheck_interval
+
+
+def diff(previous, records, now=None):
+    """比较上一份快照和本次扫描的记录（忽略历史作业），返回 (变化事件列表, 更新后的快照字典)
+    记录的 detail_checked 为 True 时把快照的 checked_at 更新为 now；本次没有出现的作业保持原快照"""
+    now = time.time() if now is None else now
+    snapshots = dict(previous)
+    changes = []
+    for record in records:
+        if record.is_history:
+            continue
+        key = homework_id(record.course, record.title)
+        old = previous.get(key)
+        new = merge(old, record, now if record.detail_checked else None)
+        snapshots[key] = new
+        if old is None:
+            changes.append(Change(NEW, key, new.course, new.title, None, new.due_time))
+            continue
+        if old.list_hash == new.list_hash and old.is_completed == new.is_completed:
+            continue
+        if old.due_time is not None and new.due_time != old.due_time:
+            changes.append(Change(DEADLINE_CHANGED, key, new.course, new.title, old.due_time, new.due_time))
+        if old.is_late_submission is False and new.is_late_submission:
+            changes.append(Change(ENTERED_LATE, key, new.course, new.title, False, True))
+        if old.is_completed is False and new.is_completed:
+            changes.append(Change(COMPLETED, key, new.course, new.title, False, True))
+    return changes, snapshots
+
+
+def changed_keys(previous, snapshots):
+    """diff() 前后两份快照中新出现或字段有变化的作业ID（不比较 checked_at），只有这些作业需要写回数据库"""
+    return {key for key, snapshot in snapshots.items()
+            if key not in previous or previous[key]._replace(checked_at=0) != snapshot._replace(checked_at=0)}
+
+
+def describe(change):
+    """变化事件的一行说明，用于日志和提醒正文"""
+    if change.kind == DEADLINE_CHANGED:
+        return f"截止时间：{change.old} → {change.new}"
+    if change.kind == NEW and change.new:
+        return f"截止时间：{change.new}"
+    return CHANGE_LABELS[change.kind]
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# --- 作业状态存储 ---
+# 每条作业一行，主键 (账号, 课程, 作业ID)；调用方只提交新作业和有变化的作业（homework_diff.changed_keys），单条事务内完成，
+# WAL 模式下写到一半崩溃也不会损坏已有数据。
+# 数据库由提醒脚本和 CGDDLHelper 共用：notified 只由提醒脚本写为 1（已经判断过是否为新作业），
+# known_ids() 只返回这些作业，CGDDLHelper 先写入的作业仍会被提醒脚本当作新作业提醒
+HOMEWORK_DB_FILE = 'homework.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS homework (
+    account            TEXT NOT NULL,
+    course             TEXT NOT NULL,
+    assignment_id      TEXT NOT NULL,
+    title              TEXT NOT NULL,
+    link               TEXT,
+    first_seen         REAL NOT NULL,
+    due_time           TEXT,
+    due_ts             REAL,
+    is_completed       INTEGER,
+    is_late_submission INTEGER,
+    notified           INTEGER NOT NULL DEFAULT 0,
+    updated_at         REAL NOT NULL,
+    PRIMARY KEY (account, course, assignment_id)
+);
+CREATE INDEX IF NOT EXISTS idx_homework_course ON homework (account, course);
+CREATE INDEX IF NOT EXISTS idx_homework_due ON homework (due_ts);
+"""
+
+# 只更新调用方提供了值的字段，notified 一旦为 1 不再改回；first_seen 保留第一次写入的时间，
+# 只有 CGDDLHelper 先写入的作业在提醒脚本第一次处理时改为提醒脚本发现它的时间
+UPSERT = """
+INSERT INTO homework (account, course, assignment_id, title, link, first_seen, due_time, due_ts,
+                      is_completed, is_late_submission, notified, updated_at)
+VALUES (:account, :course, :assignment_id, :title, :link, :first_seen, :due_time, :due_ts,
+        :is_completed, :is_late_submission, :notified, :now)
+ON CONFLICT (account, course, assignment_id) DO UPDATE SET
+    title = excluded.title,
+    first_seen = CASE WHEN notified = 0 AND excluded.notified = 1 THEN excluded.first_seen ELSE first_seen END,
+    link = COALESCE(excluded.link, link),
+    due_time = COALESCE(excluded.due_time, due_time),
+    due_ts = COALESCE(excluded.due_ts, due_ts),
+    is_completed = COALESCE(excluded.is_completed, is_completed),
+    is_late_submission = COALESCE(excluded.is_late_submission, is_late_submission),
+    notified = MAX(notified, excluded.notified),
+    updated_at = excluded.updated_at
+"""
+
+_DUE_TIME_RE = re.compile(r'(\d{4})[-/年](\d{1,2})[-/月](\d{1,2})日?\s*(\d{1,2}):(\d{2})')
+
+
+def parse_due_time(due_time):
+    """把页面上的截止时间文本解析成时间戳，无法解析时返回 None"""
+    match = _DUE_TIME_RE.search(due_time or '')
+    if not match:
+        return None
+    return datetime(*map(int, match.groups())).timestamp()
+
+
+def homework_id(course, title):
+    """与旧版 known_homework.json 中的 ID 格式保持一致"""
+    return f"{course}::{title}"
+
+
+class HomeworkStore:
+    def __init__(self, path=HOMEWORK_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(homework)')}
+        if 'notified' not in columns:
+            # 旧数据库中的作业无法区分由哪个脚本写入，按原有行为视为提醒脚本已知
+            with self._conn:
+                self._conn.execute('ALTER TABLE homework ADD COLUMN notified INTEGER NOT NULL DEFAULT 0')
+                self._conn.execute('UPDATE homework SET notified = 1')
+
+    def upsert(self, records):
+        """records: 包含 account/course/title 及可选 assignment_id/link/due_time/is_completed/is_late_submission/
+        first_seen/notified 的字典"""
+        now = time.time()
+        rows = []
+        for record in records:
+            rows.append({
+                'account': record['account'],
+                'course': record['course'],
+                'assignment_id': record.get('assignment_id') or record['title'],
+                'title': record['title'],
+                'link': record.get('link'),
+                'due_time': record.get('due_time'),
+                'due_ts': parse_due_time(record.get('due_time')),
+                'is_completed': record.get('is_completed'),
+                'is_late_submission': record.get('is_late_submission'),
+                'first_seen': record.get('first_seen', now),
+                'notified': int(bool(record.get('notified'))),
+                'now': now,
+            })
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT, rows)
+
+    def known_ids(self, account):
+        """提醒脚本已经处理过的作业（CGDDLHelper 写入的作业不算）"""
+        with self._lock:
+            rows = self._conn.execute('SELECT course, title FROM homework WHERE account = ? AND notified = 1',
+                                      (account,)).fetchall()
+        return {homework_id(row['course'], row['title']) for row in rows}
+
+    def records(self, account):
+        """该账号的所有作业行，用于恢复上次运行时的作业快照"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute('SELECT * FROM homework WHERE account = ?', (account,))]
+
+    def due_between(self, start_ts, end_ts, account=None):
+        """按截止时间范围查询（走 due_ts 索引），按截止时间排序"""
+        sql = 'SELECT * FROM homework WHERE due_ts BETWEEN ? AND ?'
+        params = [start_ts, end_ts]
+        if account is not None:
+            sql += ' AND account = ?'
+            params.append(account)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql + ' ORDER BY due_ts', params)]
+
+    def pending_due_between(self, start_ts, end_ts, account=None):
+        """截止时间在范围内且尚未确认完成的作业"""
+        return [row for row in self.due_between(start_ts, end_ts, account) if row['is_completed'] != 1]
+
+    def first_seen_times(self, account=None):
+        """所有作业的首次发现时间，用于统计老师通常在什么时候发布作业；
+        首次扫描时已经存在的作业和 CGDDLHelper 写入的作业记为 0，不参与统计"""
+        sql = 'SELECT first_seen FROM homework WHERE first_seen > 0'
+        params = []
+        if account is not None:
+            sql += ' AND account = ?'
+            params.append(account)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+    def import_known_homework_file(self, account, path):
+        """把旧版 known_homework.json 中的作业导入数据库（只在该账号还没有记录时执行）"""
+        if not os.path.exists(path):
+            return 0
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM homework WHERE account = ? AND notified = 1 LIMIT 1',
+                                  (account,)).fetchone():
+                return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                ids = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return 0
+        records = []
+        for known_id in ids:
+            course, _, title = known_id.partition('::')
+            # 旧文件没有发现时间，记为 0，不参与发布时间统计
+            records.append({'account': account, 'course': course, 'title': title, 'first_seen': 0, 'notified': True})
+        self.upsert(records)
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
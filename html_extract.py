@@ -0,0 +1,134 @@
+import glob
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# --- HTML 抽取后端 ---
+# 'html.parser': 原有方式，完整构建整棵 DOM 树
+# 'strainer':    html.parser + SoupStrainer，只构建需要的子树
+# 'lxml':        lxml + SoupStrainer（需要安装 lxml）
+# 'auto':        有 lxml 时使用 'lxml'，否则使用 'strainer'
+BACKENDS = ('html.parser', 'strainer', 'lxml')
+DEFAULT_BACKEND = 'auto'
+
+# 用正则匹配单个 class：新版 bs4 的 SoupStrainer 会把多值 class 当作整串比较
+COURSE_STRAINER = SoupStrainer(class_=re.compile(r'(^|\s)media(\s|$)'))
+ACTIVE_ASSIGN_STRAINER = SoupStrainer('div', id='activeAssignBodyDIV')
+CURRENT_HW_STRAINER = SoupStrainer('div', class_=re.compile(r'(^|\s)list-group-flush(\s|$)'))
+
+
+def resolve_backend(backend=DEFAULT_BACKEND):
+    if backend == 'auto':
+        return 'lxml' if HAS_LXML else 'strainer'
+    if backend == 'lxml' and not HAS_LXML:
+        print("未安装 lxml，HTML 解析回退到 strainer 后端。")
+        return 'strainer'
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的HTML解析后端: {backend}")
+    return backend
+
+
+def make_soup(html, strainer, backend=DEFAULT_BACKEND):
+    backend = resolve_backend(backend)
+    if backend == 'html.parser':
+        return BeautifulSoup(html, 'html.parser')
+    return BeautifulSoup(html, 'lxml' if backend == 'lxml' else 'html.parser', parse_only=strainer)
+
+
+def extract_courses(html, backend=DEFAULT_BACKEND):
+    """课程列表页面 -> [(课程名, href)]"""
+    soup = make_soup(html, COURSE_STRAINER, backend)
+    courses = []
+    for media_div in soup.select('.media'):
+        course_anchor = media_div.select_one('strong a')
+        if course_anchor:
+            courses.append((course_anchor.text.strip(), course_anchor['href']))
+    return courses
+
+
+def extract_current_homework(html, backend=DEFAULT_BACKEND):
+    """作业页面的当前作业 -> [(标题, href)]；页面中没有当前作业区块时返回 None"""
+    soup = make_soup(html, CURRENT_HW_STRAINER, backend)
+    current_hw_div = soup.select_one("div.list-group-flush.mb-4")
+    if not current_hw_div:
+        return None
+    return [(item.get_text(strip=True), item['href']) for item in current_hw_div.select("a.list-group-item")]
+
+
+def extract_history_homework(html):
+    """作业页面的历史作业 -> [(标题, href)]；历史区块依赖兄弟节点定位，始终完整解析"""
+    soup = BeautifulSoup(html, 'html.parser')
+    history = []
+    for h in soup.select("h5 span strong"):
+        if "历史作业" in h.get_text():
+            history_hw_div = h.find_parent("h5").find_next_sibling("div")
+            if history_hw_div:
+                history.extend((a.get_text(strip=True), a['href']) for a in history_hw_div.find_all("a"))
+    return history
+
+
+def extract_active_assignments(html, backend=DEFAULT_BACKEND):
+    """mainActiveAssigns.jsp -> [{'name', 'href', 'due_time', 'is_late_submission'}]"""
+    soup = make_soup(html, ACTIVE_ASSIGN_STRAINER, backend)
+    assignments = []
+    active_assignments_div = soup.find('div', id='activeAssignBodyDIV')
+    if active_assignments_div:
+        for link in active_assignments_div.find_all('a'):
+            # 获取截止时间
+            due_time_span = link.find_next('span', class_='')
+            # 检查是否为补交状态
+            badge_span = link.find_next('span', class_='badge')
+            assignments.append({
+                'name': link.get_text(strip=True),
+                'href': link['href'],
+                'due_time': due_time_span.get_text(strip=True) if due_time_span else None,
+                'is_late_submission': '补交时间' in badge_span.get_text(strip=True) if badge_span else False
+            })
+    return assignments
+
+
+# --- 等价性检查与性能对比 ---
+EXTRACTORS = {
+    'courses': extract_courses,
+    'current_homework': extract_current_homework,
+    'active_assignments': extract_active_assignments,
+}
+
+
+def benchmark(paths, rounds=50):
+    """对每个页面文件比较各后端的抽取结果是否与 html.parser 一致，并统计平均耗时"""
+    backends = [b for b in BACKENDS if b != 'lxml' or HAS_LXML]
+    all_equal = True
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        print(f"\n{path} ({len(html)} 字符)")
+        for name, extractor in EXTRACTORS.items():
+            expected = extractor(html, 'html.parser')
+            if not expected:
+                continue
+            for backend in backends:
+                equal = extractor(html, backend) == expected
+                all_equal = all_equal and equal
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    extractor(html, backend)
+                elapsed_ms = (time.perf_counter() - start) / rounds * 1000
+                print(f"  {name:<20} {backend:<12} {elapsed_ms:8.2f} ms  {'一致' if equal else '不一致！'}")
+    return all_equal
+
+
+if __name__ == "__main__":
+    # 用法: python html_extract.py [保存的页面.html ...]，不给参数时使用 fixtures 目录下的页面
+    sys.exit(0 if benchmark(sys.argv[1:] or sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))) else 1)
@@ -0,0 +1,230 @@
+import json
+import sqlite3
+import time
+from collections import namedtuple
+
+# --- 任务队列 ---
+# 协调进程把“登录账号”和“扫描课程”任务放进队列，工作进程取出执行后写回结果。
+# 默认用本地 SQLite 文件（WAL 模式，多进程可同时读写）；配置 Redis 地址时改用 Redis（需要安装 redis 包），
+# 两者接口相同。取任务时按账号轮转：最久没有被服务的账号优先，同一账号同时最多 per_account 个任务在执行
+# （默认 1，同一账号的课程任务共用一个平台会话，不能同时选中不同课程）
+JOB_QUEUE_FILE = 'jobs.db'
+JOB_LEASE = 600       # 任务执行超过该秒数视为工作进程已退出，重新放回队列
+MAX_ATTEMPTS = 3      # 单个任务最多执行次数（包括因超时重新入队）
+PER_ACCOUNT = 1       # 同一账号同时执行的最大任务数
+
+# 一个任务；payload/result 为可 JSON 序列化的字典，state 为 queued/running/done/failed
+Job = namedtuple('Job', ['id', 'kind', 'account', 'payload', 'state', 'attempts', 'result', 'error'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    state       TEXT NOT NULL DEFAULT 'queued',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    worker      TEXT,
+    result      TEXT,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    claimed_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, account);
+CREATE TABLE IF NOT EXISTS accounts_served (
+    account      TEXT PRIMARY KEY,
+    last_claimed REAL NOT NULL
+);
+"""
+
+# 可执行的任务中，选出所属账号最久没有被服务的那一个
+CLAIM = """
+SELECT j.* FROM jobs j LEFT JOIN accounts_served s ON s.account = j.account
+WHERE j.state = 'queued'
+  AND (SELECT COUNT(*) FROM jobs r WHERE r.account = j.account AND r.state = 'running') < ?
+ORDER BY COALESCE(s.last_claimed, 0), j.id
+LIMIT 1
+"""
+
+
+def _job(row):
+    return Job(row['id'], row['kind'], row['account'], json.loads(row['payload']), row['state'], row['attempts'],
+               json.loads(row['result']) if row['result'] else None, row['error'])
+
+
+class SqliteJobQueue:
+    """每个进程各自创建实例（连接不能跨进程共享），指向同一个数据库文件"""
+
+    def __init__(self, path=JOB_QUEUE_FILE, per_account=PER_ACCOUNT, lease=JOB_LEASE, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.per_account = per_account
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def put(self, kind, account, payload):
+        cursor = self._conn.execute('INSERT INTO jobs (kind, account, payload, created_at) VALUES (?, ?, ?, ?)',
+                                    (kind, account, json.dumps(payload, ensure_ascii=False), time.time()))
+        return cursor.lastrowid
+
+    def claim(self, worker):
+        """取出一个任务并标记为执行中，没有可执行的任务时返回 None"""
+        now = time.time()
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')  # 写锁，多个工作进程不会取到同一个任务
+        try:
+            # 租约过期的任务重新入队（次数用完则失败）
+            conn.execute("UPDATE jobs SET state = 'failed', error = '执行超时', finished_at = ? "
+                         "WHERE state = 'running' AND claimed_at < ? AND attempts >= ?",
+                         (now, now - self.lease, self.max_attempts))
+            conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running' AND claimed_at < ?",
+                         (now - self.lease,))
+            row = conn.execute(CLAIM, (self.per_account,)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute("UPDATE jobs SET state = 'running', attempts = attempts + 1, worker = ?, claimed_at = ? "
+                         "WHERE id = ?", (worker, now, row['id']))
+            conn.execute('INSERT INTO accounts_served (account, last_claimed) VALUES (?, ?) '
+                         'ON CONFLICT (account) DO UPDATE SET last_claimed = excluded.last_claimed',
+                         (row['account'], now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return _job(row)._replace(state='running', attempts=row['attempts'] + 1)
+
+    def complete(self, job_id, result):
+        self._conn.execute("UPDATE jobs SET state = 'done', result = ?, finished_at = ? WHERE id = ?",
+                           (json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def fail(self, job_id, error, retry=True):
+        """retry 为 True 且次数未用完时重新入队"""
+        self._conn.execute("UPDATE jobs SET state = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END, "
+                           "error = ?, finished_at = ? WHERE id = ?",
+                           (retry, self.max_attempts, str(error), time.time(), job_id))
+
+    def finished(self):
+        """取走所有已完成或最终失败的任务（取走后从队列中删除）"""
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute("SELECT * FROM jobs WHERE state IN ('done', 'failed') ORDER BY id").fetchall()
+            conn.execute('DELETE FROM jobs WHERE id IN (%s)' % ','.join('?' * len(rows)), [row['id'] for row in rows])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return [_job(row) for row in rows]
+
+    def pending(self):
+        """尚未完成（排队或执行中）的任务数"""
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+
+    def clear(self):
+        """协调进程启动时清空上次遗留的任务"""
+        self._conn.execute('DELETE FROM jobs')
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisJobQueue:
+    """与 SqliteJobQueue 接口相同，数据放在 Redis（或兼容的服务）中；按账号分列表，账号轮转列表实现公平调度。
+    不做租约回收：工作进程异常退出时，执行中的任务需要重启协调进程后重新下发"""
+
+    def __init__(self, url, per_account=PER_ACCOUNT, max_attempts=MAX_ATTEMPTS, prefix='cg:jobs'):
+        import redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.per_account = per_account
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def put(self, kind, account, payload):
+        job_id = self._redis.incr(self._key('next_id'))
+        self._redis.hset(self._key('job', str(job_id)), mapping={
+            'kind': kind, 'account': account, 'payload': json.dumps(payload, ensure_ascii=False),
+            'state': 'queued', 'attempts': 0})
+        self._redis.rpush(self._key('queue', account), job_id)
+        if self._redis.sadd(self._key('accounts_set'), account):
+            self._redis.rpush(self._key('accounts'), account)
+        return job_id
+
+    def _load(self, job_id):
+        data = self._redis.hgetall(self._key('job', str(job_id)))
+        return Job(int(job_id), data['kind'], data['account'], json.loads(data['payload']), data['state'],
+                   int(data['attempts']), json.loads(data['result']) if data.get('result') else None,
+                   data.get('error'))
+
+    def claim(self, worker):
+        r = self._redis
+        for _ in range(r.llen(self._key('accounts'))):
+            # 账号轮转：每次从队首取一个账号放到队尾
+            account = r.lmove(self._key('accounts'), self._key('accounts'), 'LEFT', 'RIGHT')
+            if account is None:
+                return None
+            running = self._key('running', account)
+            if r.incr(running) > self.per_account:
+                r.decr(running)
+                continue
+            job_id = r.lpop(self._key('queue', account))
+            if job_id is None:
+                r.decr(running)
+                continue
+            r.hset(self._key('job', job_id), mapping={'state': 'running', 'worker': worker})
+            r.hincrby(self._key('job', job_id), 'attempts', 1)
+            return self._load(job_id)
+        return None
+
+    def _finish(self, job_id, state, **fields):
+        job = self._load(job_id)
+        self._redis.hset(self._key('job', str(job_id)), mapping={'state': state, **fields})
+        self._redis.decr(self._key('running', job.account))
+        return job
+
+    def complete(self, job_id, result):
+        self._finish(job_id, 'done', result=json.dumps(result, ensure_ascii=False))
+        self._redis.rpush(self._key('finished'), job_id)
+
+    def fail(self, job_id, error, retry=True):
+        job = self._load(job_id)
+        if retry and job.attempts < self.max_attempts:
+            self._finish(job_id, 'queued', error=str(error))
+            self._redis.rpush(self._key('queue', job.account), job_id)
+        else:
+            self._finish(job_id, 'failed', error=str(error))
+            self._redis.rpush(self._key('finished'), job_id)
+
+    def finished(self):
+        jobs = []
+        while (job_id := self._redis.lpop(self._key('finished'))) is not None:
+            jobs.append(self._load(job_id))
+            self._redis.delete(self._key('job', job_id))
+        return jobs
+
+    def pending(self):
+        return sum(self._redis.llen(key) for key in self._redis.scan_iter(self._key('queue', '*'))) + \
+            sum(int(self._redis.get(key) or 0) for key in self._redis.scan_iter(self._key('running', '*')))
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self._key('*')))
+        if keys:
+            self._redis.delete(*keys)
+
+    def close(self):
+        self._redis.close()
+
+
+def open_queue(config):
+    """config.json 中配置了 job_queue_redis（如 redis://localhost:6379/0）时用 Redis，否则用本地 SQLite 文件"""
+    per_account = config.get('jobs_per_account', PER_ACCOUNT)
+    if config.get('job_queue_redis'):
+        return RedisJobQueue(config['job_queue_redis'], per_account=per_account)
+    return SqliteJobQueue(config.get('job_queue_file', JOB_QUEUE_FILE), per_account=per_account)
@@ -0,0 +1,212 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+# --- 耗时统计与指标导出 ---
+# 在热点路径（验证码识别、登录、课程页面请求、HTML 解析）周围记录耗时区间，每轮检查结束时汇总为
+# 各区间的次数、总耗时和 p50/p95/p99，以及请求数、下载字节数（线路上的响应体大小，压缩时按压缩后计）、
+# OCR 成功率、登录失败数，追加到 JSON-lines 日志并覆盖写入 Prometheus 文本格式文件
+# （可由 node_exporter 的 textfile 收集器读取；每个账号一组带 account 标签的序列）。
+# 未配置导出文件时 span() 直接返回空的上下文管理器，也不会给会话挂载响应钩子。
+# 多账号时每个账号的监控任务先调用 set_account()，本轮数据按账号分开缓存，end_cycle(account=...) 只汇总该账号的数据；
+# 账号记在 contextvars 中，scheduler.run_blocking 和遍历时的详情页线程会带上调用方的上下文
+METRICS_PREFIX = 'cg'
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NULL_SPAN = nullcontext()
+_current_account = contextvars.ContextVar('metrics_account', default=None)
+
+
+def percentile(values, fraction):
+    """最近秩法百分位数，values 需已排序"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(fraction * len(values)))) - 1]
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.incr(f"{self.name}_errors")
+        return False
+
+
+class Metrics:
+    """进程内所有账号、所有线程共用；一个账号一轮检查的数据在 end_cycle() 时汇总导出并清空"""
+
+    def __init__(self):
+        self.enabled = False
+        self.jsonl_path = None
+        self.prom_path = None
+        self._lock = threading.Lock()
+        self._spans = defaultdict(lambda: defaultdict(list))       # 本轮：账号 -> 区间名 -> 耗时列表
+        self._counters = defaultdict(lambda: defaultdict(float))   # 本轮：账号 -> 计数
+        self._span_totals = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))  # 累计：账号 -> 区间名 -> [次数, 总耗时]
+        self._counter_totals = defaultdict(lambda: defaultdict(float))          # 累计：账号 -> 计数
+        self._cycles = defaultdict(int)  # 账号 -> 累计轮数
+        self._last = {}  # 账号 -> 最近一轮的记录，用于分位数、本轮耗时和 OCR 成功率
+        self._configured_at = time.perf_counter()
+        self._cycle_start = {}  # 账号 -> 本轮开始时间
+
+    def configure(self, jsonl_path=None, prom_path=None):
+        """至少提供一个导出文件时才开启统计"""
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.enabled = bool(jsonl_path or prom_path)
+        self._configured_at = time.perf_counter()
+        self._cycle_start = {}
+
+    @staticmethod
+    def set_account(account):
+        """之后在当前上下文中记录的区间和计数归入该账号（asyncio 任务各有自己的上下文，互不影响）"""
+        _current_account.set(account)
+
+    def span(self, name):
+        """with metrics.span('login'): ...  未开启时开销只有一次属性判断"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        account = _current_account.get()
+        with self._lock:
+            self._spans[account][name].append(seconds)
+
+    def incr(self, name, value=1):
+        if not self.enabled:
+            return
+        account = _current_account.get()
+        with self._lock:
+            self._counters[account][name] += value
+
+    def count_response(self, response, *args, **kwargs):
+        """requests 的 response 钩子：统计请求数和下载字节数（包括重定向中间的响应）"""
+        self.incr('requests')
+        self.incr('bytes_downloaded', wire_size(response))
+        if response.status_code >= 400:
+            self.incr('http_errors')
+
+    def instrument_session(self, session):
+        """供 session_hooks 使用"""
+        session.hooks['response'].append(self.count_response)
+
+    def end_cycle(self, account=None, **labels):
+        """汇总该账号（与 set_account() 传入的相同）本轮的数据并导出；account 和其他 labels（如 state）写入 JSON-lines 记录"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            spans = self._spans.pop(account, {})
+            counters = self._counters.pop(account, {})
+            now = time.perf_counter()
+            duration = now - self._cycle_start.get(account, self._configured_at)
+            self._cycle_start[account] = now
+            self._cycles[account] += 1
+            for name, values in spans.items():
+                total = self._span_totals[account][name]
+                total[0] += len(values)
+                total[1] += sum(values)
+            for name, value in counters.items():
+                self._counter_totals[account][name] += value
+
+        if account is not None:
+            labels = {'account': account, **labels}
+        record = {'time': time.time(), **labels, 'cycle_seconds': round(duration, 6), 'spans': {}}
+        for name, values in sorted(spans.items()):
+            values.sort()
+            summary = {'count': len(values), 'total': round(sum(values), 6)}
+            summary.update({f"p{int(q * 100)}": round(percentile(values, q), 6) for q in QUANTILES})
+            record['spans'][name] = summary
+        record['counters'] = dict(sorted(counters.items()))
+        attempts = counters.get('ocr_attempts', 0)
+        if attempts:
+            record['ocr_success_rate'] = round(counters.get('ocr_accepted', 0) / attempts, 4)
+
+        with self._lock:
+            self._last[account] = record
+        try:
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if self.prom_path:
+                self._write_prometheus()
+        except OSError as e:
+            print(f"写入指标文件失败: {e}")
+        return record
+
+    def _write_prometheus(self):
+        """所有账号写在同一个文件中，每个账号的序列带 account 标签，各账号的数据互不覆盖"""
+        p = METRICS_PREFIX
+        with self._lock:
+            span_totals = {account: {name: tuple(total) for name, total in totals.items()}
+                           for account, totals in self._span_totals.items()}
+            counter_totals = {account: dict(totals) for account, totals in self._counter_totals.items()}
+            cycles = dict(self._cycles)
+            last = dict(self._last)
+        accounts = sorted(cycles, key=lambda account: (account is not None, str(account)))
+        spans, counters, gauges = [], defaultdict(list), defaultdict(list)
+        for account in accounts:
+            label = '' if account is None else f'account="{_escape(account)}",'
+            record = last[account]
+            for name, (count, total) in sorted(span_totals.get(account, {}).items()):
+                summary = record['spans'].get(name)
+                if summary:
+                    for q in QUANTILES:
+                        spans.append(f'{p}_span_seconds{{{label}span="{name}",quantile="{q}"}} '
+                                     f'{summary[f"p{int(q * 100)}"]}')
+                spans.append(f'{p}_span_seconds_sum{{{label}span="{name}"}} {total:.6f}')
+                spans.append(f'{p}_span_seconds_count{{{label}span="{name}"}} {count}')
+            series = f"{{{label.rstrip(',')}}}" if label else ''
+            for name, value in sorted(counter_totals.get(account, {}).items()):
+                counters[name].append(f"{p}_{name}_total{series} {value:g}")
+            counters['cycles'].append(f"{p}_cycles_total{series} {cycles[account]}")
+            gauges['cycle_duration_seconds'].append(f"{p}_cycle_duration_seconds{series} {record['cycle_seconds']}")
+            if 'ocr_success_rate' in record:
+                gauges['ocr_success_ratio'].append(f"{p}_ocr_success_ratio{series} {record['ocr_success_rate']}")
+
+        lines = [f"# HELP {p}_span_seconds 热点路径耗时（分位数为最近一轮，sum/count 为累计）",
+                 f"# TYPE {p}_span_seconds summary"] + spans
+        for name, samples in sorted(counters.items()):
+            lines += [f"# TYPE {p}_{name}_total counter"] + samples
+        for name, samples in sorted(gauges.items()):
+            lines += [f"# TYPE {p}_{name} gauge"] + samples
+
+        # 先写临时文件再替换，采集方不会读到写了一半的文件
+        tmp_path = self.prom_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prom_path)
+
+
+def wire_size(response):
+    """响应体在线路上的字节数（gzip/br 压缩时为压缩后的大小）；没有底层连接的响应（如回放）按内容长度计"""
+    size = len(response.content)  # 先读完响应体，tell() 才是完整的线路字节数
+    tell = getattr(response.raw, 'tell', None)
+    if tell is not None:
+        try:
+            return tell() or size
+        except (OSError, ValueError):
+            pass
+    return size
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
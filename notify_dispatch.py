@@ -0,0 +1,185 @@
+import queue
+import smtplib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from homework_diff import CHANGE_LABELS, NEW
+
+# --- 通知分发 ---
+# 新作业和作业变化（截止时间变更、进入补交、已完成）的提醒先进入队列，后台线程把 window 秒内的提醒按账号合并成一条摘要，再分发到桌面弹窗和邮件；
+# 邮件复用同一个 SMTP 连接，失败时指数退避重试。扫描线程只负责入队，永远不会因为发送而阻塞
+SMTP_HOST = 'smtp.qq.com'
+SMTP_PORT = 587
+SMTP_KEEPALIVE = 120  # 连接空闲超过该秒数后先 NOOP 探测，失效则重连
+SMTP_RETRIES = 3
+SMTP_BACKOFF = 2      # 第 n 次重试前等待 SMTP_BACKOFF ** n 秒
+NOTIFY_WINDOW = 10    # 合并提醒的时间窗口（秒）
+
+# kind 为 homework_diff 中的变化类型，detail 为附加说明（如新旧截止时间）
+Alert = namedtuple('Alert', ['account', 'course', 'title', 'kind', 'detail'], defaults=(NEW, None))
+
+
+class SmtpPool:
+    """复用单个 SMTP 连接；host/port 指向本地调试服务器（如 python -m aiosmtpd -n -l localhost:1025）时
+    把 use_tls 设为 False、不提供密码即可用于测试"""
+
+    def __init__(self, sender_email, sender_password=None, host=SMTP_HOST, port=SMTP_PORT, use_tls=True,
+                 keepalive=SMTP_KEEPALIVE, retries=SMTP_RETRIES, backoff=SMTP_BACKOFF):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.keepalive = keepalive
+        self.retries = retries
+        self.backoff = backoff
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            server.starttls()  # 启动 TLS 加密
+        if self.sender_password:
+            server.login(self.sender_email, self.sender_password)
+        return server
+
+    def _get_server(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.keepalive:
+            try:
+                if self._server.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected()
+            except (smtplib.SMTPException, OSError):
+                self._discard()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _discard(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        self._server = None
+
+    def send(self, subject, body, to_email):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender_email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(f"<pre>{body}</pre>", 'html', 'utf-8'))
+
+        with self._lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    self._get_server().sendmail(self.sender_email, to_email, msg.as_string())
+                    self._last_used = time.monotonic()
+                    return
+                except (smtplib.SMTPException, OSError) as e:
+                    self._discard()
+                    if attempt == self.retries:
+                        raise
+                    wait = self.backoff ** attempt
+                    print(f"邮件发送失败（第 {attempt + 1} 次）: {e}，{wait} 秒后重试...")
+                    time.sleep(wait)
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._server = None
+
+
+def desktop_notify(title, message):
+    from plyer import notification
+    notification.notify(title=title, message=message, timeout=180)
+
+
+def format_digest(account, alerts):
+    """一条提醒时保持原来的弹窗格式，多条时合并成摘要；返回 (标题, 正文)"""
+    kinds = {alert.kind for alert in alerts}
+    label = CHANGE_LABELS[alerts[0].kind] if len(kinds) == 1 else '作业提醒'
+    if len(alerts) == 1:
+        alert = alerts[0]
+        detail = f"\n{alert.detail}" if alert.detail else ''
+        return f"【{label}】{alert.course}", f"任务：{alert.title}{detail}"
+    lines = []
+    for alert in alerts:
+        prefix = f"[{CHANGE_LABELS[alert.kind]}] " if len(kinds) > 1 else ''
+        detail = f"（{alert.detail}）" if alert.detail else ''
+        lines.append(f"{prefix}{alert.course}：{alert.title}{detail}")
+    return f"【{label}】{account} 共 {len(alerts)} 项", "\n".join(lines)
+
+
+class NotificationDispatcher:
+    """后台线程：收集 window 秒内的提醒，按账号合并后发送到桌面（desktop=True）和邮件（提供 smtp_pool 时）"""
+
+    def __init__(self, window=NOTIFY_WINDOW, desktop=True, smtp_pool=None, recipient_email=None):
+        self.window = window
+        self.desktop = desktop
+        self.smtp_pool = smtp_pool
+        self.recipient_email = recipient_email
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='通知分发', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, alert):
+        """线程安全，可在扫描线程或事件循环中直接调用"""
+        self._queue.put(alert)
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            batch = [alert]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    alert = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if alert is None:
+                    stop = True
+                    break
+                batch.append(alert)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        by_account = OrderedDict()
+        for alert in batch:
+            by_account.setdefault(alert.account, []).append(alert)
+        for account, alerts in by_account.items():
+            title, message = format_digest(account, alerts)
+            if self.desktop:
+                try:
+                    desktop_notify(title, message)
+                except Exception as e:
+                    print(f"桌面通知失败: {e}")
+            if self.smtp_pool and self.recipient_email:
+                try:
+                    self.smtp_pool.send(title, message, self.recipient_email)
+                    print(f"[{account}] 提醒邮件发送成功（{len(alerts)} 项）。")
+                except Exception as e:
+                    print(f"[{account}] 提醒邮件发送失败: {e}")
+
+    def close(self, timeout=30):
+        """发送完队列中剩余的提醒后停止"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.smtp_pool:
+            self.smtp_pool.close()
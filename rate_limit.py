@@ -0,0 +1,63 @@
+import multiprocessing
+import threading
+import time
+
+# --- 全局限速 ---
+# 令牌桶通过 cg_client.set_rate_limiter() 装到平台适配器上，重定向和重试发出的请求同样计数
+DEFAULT_RATE = 5.0  # 每秒最多请求数（所有账号、所有线程合计）
+DEFAULT_BURST = 5   # 允许的瞬时突发请求数
+
+
+class RateLimiter:
+    """线程安全的令牌桶：所有共享同一个实例的会话合计不超过 rate 次/秒"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._day = time.strftime('%Y-%m-%d')
+        self.requests_today = 0  # 当天（本地时间）发出的请求数
+
+    def _count(self):
+        today = time.strftime('%Y-%m-%d')
+        if today != self._day:
+            self._day, self.requests_today = today, 0
+        self.requests_today += 1
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self._count()
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimiter:
+    """跨进程共享的令牌桶：令牌数和上次补充时间放在 multiprocessing 共享内存中，由协调进程创建，
+    作为参数传给各工作进程后，所有进程对平台的请求合计不超过 rate 次/秒"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, context=multiprocessing):
+        self.rate = rate
+        self.burst = burst
+        self._state = context.Array('d', [burst, time.monotonic()])  # [令牌数, 上次补充时间]
+
+    def acquire(self):
+        while True:
+            with self._state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.burst, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from cg_client import PlatformAdapter, acquire_token
+
+# --- 录制与回放 ---
+# 录制：把真实平台的响应（登录页、验证码、课程列表、作业页面等）保存到 fixtures/<名称>/ 下；
+# 回放：用保存的响应代替网络请求，可配置模拟延迟，用于离线测试和性能对比。
+# 选课之后的 main.jsp、redirect.jsp?tab=-2、mainActiveAssigns.jsp 内容取决于当前选中的课程，
+# 这些请求的键会带上该会话最近一次访问的其他页面（即选课链接）
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+COURSE_SCOPED_PATHS = ('/main.jsp', '/includes/redirect.jsp', '/assignment/mainActiveAssigns.jsp')
+INDEX_FILE = 'index.json'
+
+
+def is_course_scoped(url):
+    return urlsplit(url).path in COURSE_SCOPED_PATHS
+
+
+def request_key(method, url, context):
+    parts = urlsplit(url)
+    key = f"{method} {parts.path}"
+    if parts.query:
+        key += f"?{parts.query}"
+    if context and is_course_scoped(url):
+        key += f" @ {context}"
+    return key
+
+
+class Cassette:
+    """一组录制的响应：index.json 记录 键 -> 状态码/响应头/响应体文件名"""
+
+    def __init__(self, name, directory=FIXTURE_DIR):
+        self.path = os.path.join(directory, name)
+        self.entries = {}
+        self._lock = threading.Lock()
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def put(self, key, response):
+        body_file = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.bin'
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, body_file), 'wb') as f:
+            f.write(response.content)
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() in ('content-type', 'etag', 'last-modified', 'location')}
+        with self._lock:
+            self.entries[key] = {'status': response.status_code, 'headers': headers, 'body': body_file,
+                                 'url': response.url}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(self.path, entry['body']), 'rb') as f:
+            return entry, f.read()
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            with open(os.path.join(self.path, INDEX_FILE), 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+
+
+class _ContextMixin:
+    """记录该会话最近访问的非课程相关页面，作为课程相关请求的上下文"""
+
+    def _key_for(self, request):
+        key = request_key(request.method, request.url, self.context)
+        if request.method == 'GET' and not is_course_scoped(request.url):
+            parts = urlsplit(request.url)
+            self.context = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        return key
+
+
+class RecordingAdapter(_ContextMixin, PlatformAdapter):
+    """正常发送请求（与平台适配器一样受全局限速约束），同时把响应写入 cassette"""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.context = None
+
+    def send(self, request, **kwargs):
+        key = self._key_for(request)
+        response = super().send(request, **kwargs)
+        response.content  # 读取完整响应体
+        self.cassette.put(key, response)
+        return response
+
+
+class ReplayAdapter(_ContextMixin, HTTPAdapter):
+    """不访问网络，从 cassette 中返回录制的响应；latency 为每次请求的模拟延迟（秒），jitter 为延迟抖动比例。
+    与平台适配器一样先申请全局限速令牌，回放时也能观察限速的影响"""
+
+    def __init__(self, cassette, latency=0.0, jitter=0.0, stats=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.stats = stats if stats is not None else ReplayStats()
+        self.context = None
+
+    def send(self, request, **kwargs):
+        acquire_token()
+        key = self._key_for(request)
+        if self.latency:
+            time.sleep(self.latency * (1 + random.uniform(-self.jitter, self.jitter)))
+        found = self.cassette.get(key)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if found is None:
+            print(f"回放缺少录制的响应: {key}")
+            response.status_code = 404
+            response._content = b''
+            response.headers = CaseInsensitiveDict()
+        else:
+            entry, body = found
+            response.status_code = entry['status']
+            response._content = body
+            response.headers = CaseInsensitiveDict(entry['headers'])
+            response.url = entry.get('url', request.url)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+        self.stats.record(len(response.content))
+        return response
+
+
+class ReplayStats:
+    """回放过程中的请求数和下载字节数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.bytes = 0
+
+
+def mount(session, adapter_factory):
+    """在会话上挂载录制/回放适配器；每个会话使用独立的适配器实例，以便分别跟踪选中的课程"""
+    adapter = adapter_factory()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
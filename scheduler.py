@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+import functools
+import random
+import time
+from collections import Counter
+
+# --- 异步调度 ---
+# 监控状态
+FAST_LOGIN = 'fast_login'        # 启动后的快速登录尝试
+SLOW_POLLING = 'slow_polling'    # 登录成功后的定期检查
+MANUAL_NEEDED = 'manual_needed'  # 自动识别连续失败，等待手动输入验证码
+
+
+def jittered(interval, jitter=0.1):
+    """在 interval 上加减 jitter 比例的随机抖动，避免每次请求都落在固定时刻"""
+    return max(0.0, interval * (1 + random.uniform(-jitter, jitter)))
+
+
+# 自适应轮询的默认参数
+POLL_MIN_INTERVAL = 60          # 临近截止或处于常见发布时段时的轮询间隔
+POLL_MAX_INTERVAL = 60 * 60     # 长期没有变化时退避到的最大间隔
+NEAR_DEADLINE_SECONDS = 6 * 3600  # 有未完成作业在该时间内截止时按最小间隔轮询
+PUBLISH_HOUR_THRESHOLD = 2      # 同一“星期几+小时”内历史上至少发布过这么多次作业，视为常见发布时段
+
+
+class AdaptivePoller:
+    """根据截止时间和历史发布时间计算下一次轮询间隔：
+    临近截止 -> 最小间隔；常见发布时段 -> 两倍最小间隔；其余情况从 base_interval 起按连续无变化次数指数退避"""
+
+    def __init__(self, base_interval, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL,
+                 near_deadline=NEAR_DEADLINE_SECONDS, publish_threshold=PUBLISH_HOUR_THRESHOLD):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.near_deadline = near_deadline
+        self.publish_threshold = publish_threshold
+        self.idle_cycles = 0
+        self.publish_hours = Counter()
+
+    @staticmethod
+    def hour_of_week(ts):
+        local = time.localtime(ts)
+        return local.tm_wday * 24 + local.tm_hour
+
+    def learn_publish_times(self, first_seen_times):
+        self.publish_hours = Counter(self.hour_of_week(ts) for ts in first_seen_times)
+
+    def next_interval(self, found_new, pending_due_times, now=None):
+        """found_new: 本轮是否发现新作业；pending_due_times: 未完成作业的截止时间戳"""
+        now = time.time() if now is None else now
+        self.idle_cycles = 0 if found_new else self.idle_cycles + 1
+
+        if any(0 <= due - now <= self.near_deadline for due in pending_due_times):
+            reason, interval = "临近截止", self.min_interval
+        elif self.publish_hours[self.hour_of_week(now)] >= self.publish_threshold:
+            reason, interval = "常见发布时段", self.min_interval * 2
+        elif found_new:
+            reason, interval = "刚发现新作业", self.base_interval
+        else:
+            reason, interval = f"连续 {self.idle_cycles} 轮无变化", self.base_interval * 2 ** min(self.idle_cycles - 1, 16)
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        return interval, reason
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在线程池中运行阻塞函数（网络请求、OCR、弹窗等），线程中沿用调用方的 contextvars（如 metrics 的账号）。
+    不设总超时：线程无法从外部中止，放弃等待只会让它在后台继续改动会话和状态；单个请求的超时由 HTTP 层负责"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
+
+
+class BackgroundWorker:
+    """独立运行的后台任务：从队列取出条目交给 handler 处理，处理慢也不会拖住调度循环"""
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run(), name=self.name)
+        return self
+
+    def submit(self, item):
+        self.queue.put_nowait(item)
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await run_blocking(self.handler, item)
+            except Exception as e:
+                print(f"[{self.name}] 处理失败: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def stop(self, drain_timeout=10):
+        """优雅停止：先在限定时间内处理完队列中剩余的条目，再取消任务"""
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"[{self.name}] 仍有 {self.queue.qsize()} 个条目未处理，强制停止。")
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,88 @@
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import captcha_solver
+from captcha_solver import GLYPH_SIZE, GlyphLibrary, TesserocrEngine, vote
+
+# --- 验证码识别测试（不需要安装 Tesseract） ---
+# 用法: python -m pytest test_captcha_solver.py
+
+
+def test_vote_by_position():
+    assert vote(['AB3D5', 'AB8D5', 'XB8D5']) == 'AB8D5'
+
+
+def test_vote_tie_prefers_earlier_candidate():
+    assert vote(['AB3D5', 'AB8D5']) == 'AB3D5'
+
+
+def test_vote_ignores_invalid_candidates():
+    assert vote(['', 'AB3D', 'AB 3D', 'ZZZZZ', 'AB3D5!']) == 'ZZZZZ'
+    assert vote(['', 'ABC']) is None
+    assert vote([]) is None
+
+
+class FakeTessBaseAPI:
+    """记录创建了多少个句柄，以及同一个句柄是否被多个线程同时使用"""
+    created = []
+
+    def __init__(self, psm=None):
+        self.busy = threading.Lock()
+        self.shared = False
+        self.threads = set()
+        FakeTessBaseAPI.created.append(self)
+
+    def SetVariable(self, name, value):
+        pass
+
+    def SetImage(self, image):
+        if not self.busy.acquire(blocking=False):
+            self.shared = True
+            return
+        self.threads.add(threading.get_ident())
+        threading.Event().wait(0.01)  # 模拟识别耗时，放大并发使用的窗口
+        self.busy.release()
+
+    def GetUTF8Text(self):
+        return 'AB3D5\n'
+
+
+def test_tesserocr_engine_one_handle_per_thread(monkeypatch):
+    FakeTessBaseAPI.created = []
+    fake = types.SimpleNamespace(PyTessBaseAPI=FakeTessBaseAPI, PSM=types.SimpleNamespace(SINGLE_WORD=8))
+    monkeypatch.setattr(captcha_solver, 'tesserocr', fake, raising=False)
+    engine = TesserocrEngine()
+    binary = np.zeros((20, 60), dtype=np.uint8)
+    barrier = threading.Barrier(4)
+
+    def recognize(_):
+        barrier.wait()
+        return engine.recognize(binary)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(recognize, range(8)))
+    assert results == ['AB3D5'] * 8
+    assert not any(api.shared for api in FakeTessBaseAPI.created)
+    assert all(len(api.threads) <= 1 for api in FakeTessBaseAPI.created)
+    assert len(FakeTessBaseAPI.created) == 5  # 创建引擎的线程一个，每个识别线程各一个（只创建一次）
+
+
+
+def test_glyph_library_keeps_newest_samples_per_label(monkeypatch, tmp_path):
+    """每次登录都学习 5 个字形：样本数按字符封顶，超出时丢弃最早的，保存再加载后不变"""
+    # 用学习的序号作为字形向量的值，便于检查留下的是哪些样本
+    monkeypatch.setattr(captcha_solver, 'segment',
+                        lambda binary, count=5: np.full((count, GLYPH_SIZE[0] * GLYPH_SIZE[1]), binary, np.float32))
+    path = str(tmp_path / 'glyphs.npz')
+    library = GlyphLibrary(path)
+    rounds = captcha_solver.MAX_GLYPHS_PER_LABEL + 10
+    for n in range(rounds):
+        assert library.learn(n, 'AAB12')
+    counts = {label: int((library.labels == label).sum()) for label in 'AB12'}
+    assert counts == dict.fromkeys('AB12', captcha_solver.MAX_GLYPHS_PER_LABEL)
+    assert library.vectors[library.labels == 'B'][:, 0].tolist() == list(range(10, rounds))
+    library.save()
+    assert len(GlyphLibrary(path)) == len(library)
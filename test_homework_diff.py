@@ -0,0 +1,90 @@
+from cg_client import HomeworkRecord
+from homework_diff import COMPLETED, DEADLINE_CHANGED, ENTERED_LATE, NEW, changed_keys, diff, merge, needs_detail
+
+# --- 作业快照与变化检测测试 ---
+# 用法: python -m pytest test_homework_diff.py
+NOW = 1_000_000.0
+
+
+def record(title='实验一', due_time='2025-11-01 23:59', is_completed=None, is_late_submission=False,
+           detail_checked=False, is_history=False):
+    return HomeworkRecord('s', '操作系统', title, f'assignment/index.jsp?t={title}', due_time, is_completed,
+                          is_late_submission, True, is_history, False, detail_checked)
+
+
+def snapshot_of(item, checked_at=NOW):
+    return merge(None, item, checked_at)
+
+
+def kinds(changes):
+    return sorted(change.kind for change in changes)
+
+
+def test_new_assignment():
+    changes, snapshots = diff({}, [record()], now=NOW)
+    assert kinds(changes) == [NEW]
+    assert changes[0].new == '2025-11-01 23:59'
+    assert list(snapshots) == ['操作系统::实验一']
+
+
+def test_unchanged_assignment_has_no_changes():
+    previous = {'操作系统::实验一': snapshot_of(record(is_completed=False))}
+    changes, snapshots = diff(previous, [record()], now=NOW + 10)
+    assert changes == []
+    assert snapshots['操作系统::实验一'].is_completed is False  # 本次未请求详情页，沿用上一份快照
+
+
+def test_deadline_changed():
+    previous = {'操作系统::实验一': snapshot_of(record(is_completed=False))}
+    changes, _ = diff(previous, [record(due_time='2025-11-08 23:59')], now=NOW)
+    assert kinds(changes) == [DEADLINE_CHANGED]
+    assert (changes[0].old, changes[0].new) == ('2025-11-01 23:59', '2025-11-08 23:59')
+
+
+def test_completed_and_entered_late():
+    previous = {'操作系统::实验一': snapshot_of(record(is_completed=False))}
+    changes, _ = diff(previous, [record(is_completed=True, is_late_submission=True, detail_checked=True)], now=NOW)
+    assert kinds(changes) == [COMPLETED, ENTERED_LATE]
+
+
+def test_history_records_ignored():
+    changes, snapshots = diff({}, [record(is_history=True)], now=NOW)
+    assert changes == [] and snapshots == {}
+
+
+def test_missing_assignment_keeps_snapshot():
+    previous = {'操作系统::实验一': snapshot_of(record(is_completed=False))}
+    _, snapshots = diff(previous, [], now=NOW)
+    assert snapshots == previous
+
+
+def test_checked_at_updated_only_when_detail_fetched():
+    previous = {'操作系统::实验一': snapshot_of(record(is_completed=False), checked_at=NOW)}
+    _, snapshots = diff(previous, [record()], now=NOW + 100)
+    assert snapshots['操作系统::实验一'].checked_at == NOW
+    _, snapshots = diff(previous, [record(is_completed=False, detail_checked=True)], now=NOW + 100)
+    assert snapshots['操作系统::实验一'].checked_at == NOW + 100
+
+
+def test_changed_keys():
+    previous = {'操作系统::实验一': snapshot_of(record(is_completed=False))}
+    items = [record(detail_checked=True, is_completed=False), record('实验二')]
+    _, snapshots = diff(previous, items, now=NOW + 100)
+    assert changed_keys(previous, snapshots) == {'操作系统::实验二'}  # 只有 checked_at 变化的不算
+    _, snapshots = diff(previous, [record(due_time='2025-11-08 23:59')], now=NOW)
+    assert changed_keys(previous, snapshots) == {'操作系统::实验一'}
+
+
+def test_needs_detail():
+    item = record(is_completed=False)
+    pending = snapshot_of(item, checked_at=NOW)
+    done = snapshot_of(record(is_completed=True), checked_at=NOW)
+    fields = (item.title, item.link, item.due_time, item.is_late_submission)
+
+    assert needs_detail(None, *fields, now=NOW)                           # 新作业
+    assert needs_detail(snapshot_of(record()), *fields, now=NOW)          # 完成情况未知
+    assert not needs_detail(pending, *fields, now=NOW + 10)               # 指纹不变，未到复查间隔
+    assert needs_detail(pending, *fields, now=NOW + 10, recheck_interval=5)
+    assert not needs_detail(done, *fields, now=NOW + 10 ** 6)             # 已完成的作业不复查
+    assert needs_detail(done, item.title, item.link, '2025-11-08 23:59', False, now=NOW)  # 列表指纹变化
+    assert not needs_detail(pending, item.title, None, None, None, now=NOW + 10)  # 缺失的字段沿用快照
@@ -0,0 +1,42 @@
+import glob
+import os
+
+import pytest
+
+from html_extract import BACKENDS, EXTRACTORS, FIXTURE_DIR, HAS_LXML, extract_history_homework
+
+# --- 解析后端等价性测试 ---
+# fixtures 目录下的每个页面、每个抽取函数，各后端的结果都必须与 html.parser 完全一致。
+# 用法: python -m pytest test_html_extract.py
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))
+
+
+def read_fixture(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_fixtures_present():
+    assert FIXTURES, f"{FIXTURE_DIR} 中没有 .html 页面"
+
+
+@pytest.mark.parametrize('backend', [backend for backend in BACKENDS if backend != 'html.parser'])
+@pytest.mark.parametrize('extractor', sorted(EXTRACTORS))
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_backend_matches_html_parser(path, extractor, backend):
+    if backend == 'lxml' and not HAS_LXML:
+        pytest.skip("未安装 lxml")
+    html = read_fixture(path)
+    extract = EXTRACTORS[extractor]
+    assert extract(html, backend) == extract(html, 'html.parser')
+
+
+@pytest.mark.parametrize('extractor', sorted(EXTRACTORS))
+def test_each_extractor_covered_by_fixtures(extractor):
+    """至少有一个页面能抽取出内容，否则上面的比较只是在比较空结果"""
+    assert any(EXTRACTORS[extractor](read_fixture(path), 'html.parser') for path in FIXTURES)
+
+
+def test_history_homework_from_fixture():
+    html = read_fixture(os.path.join(FIXTURE_DIR, 'sample_homework_page.html'))
+    assert extract_history_homework(html)
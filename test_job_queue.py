@@ -0,0 +1,82 @@
+import time
+
+from job_queue import SqliteJobQueue
+
+# --- 任务队列测试（SQLite 实现） ---
+# 用法: python -m pytest test_job_queue.py
+
+
+def make_queue(tmp_path, **kwargs):
+    return SqliteJobQueue(str(tmp_path / 'jobs.db'), **kwargs)
+
+
+def test_one_running_job_per_account(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.put('course', 'a', {'n': 1})
+    queue.put('course', 'a', {'n': 2})
+    first = queue.claim('w1')
+    assert first.payload == {'n': 1} and first.state == 'running' and first.attempts == 1
+    assert queue.claim('w2') is None  # 同一账号的下一个任务要等前一个完成
+    queue.complete(first.id, {'ok': True})
+    assert queue.claim('w2').payload == {'n': 2}
+    queue.close()
+
+
+def test_accounts_take_turns(tmp_path):
+    """账号 a 的任务先入队也不会独占队列：最久没被服务的账号优先"""
+    queue = make_queue(tmp_path, per_account=10)
+    for n in range(3):
+        queue.put('course', 'a', {'n': n})
+    for n in range(3):
+        queue.put('course', 'b', {'n': n})
+    order = []
+    for _ in range(6):
+        job = queue.claim('w')
+        order.append(job.account)
+        queue.complete(job.id, {})
+        time.sleep(0.002)  # 轮转按领取时间排序
+    assert order == ['a', 'b', 'a', 'b', 'a', 'b']
+    queue.close()
+
+
+def test_fail_requeues_until_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    job_id = queue.put('login', 'a', {})
+    queue.fail(queue.claim('w').id, '验证码错误')
+    job = queue.claim('w')
+    assert job.id == job_id and job.attempts == 2
+    queue.fail(job.id, '验证码错误')
+    assert queue.claim('w') is None
+    finished = queue.finished()
+    assert [(j.id, j.state, j.error) for j in finished] == [(job_id, 'failed', '验证码错误')]
+    assert queue.finished() == []  # 取走后从队列中删除
+    queue.close()
+
+
+def test_expired_lease_requeued(tmp_path):
+    """工作进程执行中退出：租约过期后任务重新入队，次数用完则失败"""
+    queue = make_queue(tmp_path, lease=0.05, max_attempts=2)
+    job_id = queue.put('course', 'a', {})
+    assert queue.claim('w1').id == job_id
+    assert queue.claim('w2') is None
+    time.sleep(0.1)
+    job = queue.claim('w2')
+    assert job.id == job_id and job.attempts == 2
+    time.sleep(0.1)
+    assert queue.claim('w3') is None
+    assert [(j.id, j.state, j.error) for j in queue.finished()] == [(job_id, 'failed', '执行超时')]
+    queue.close()
+
+
+def test_two_connections_never_claim_same_job(tmp_path):
+    """多个工作进程各自打开同一个数据库文件"""
+    first, second = make_queue(tmp_path, per_account=10), make_queue(tmp_path, per_account=10)
+    for n in range(20):
+        first.put('course', f'acc{n % 4}', {'n': n})
+    claimed = []
+    for _ in range(10):
+        claimed += [job.id for job in (first.claim('w1'), second.claim('w2')) if job]
+    assert len(claimed) == len(set(claimed)) == 20
+    assert first.pending() == 20 and second.claim('w2') is None
+    first.close()
+    second.close()
@@ -0,0 +1,39 @@
+import time
+
+from scheduler import AdaptivePoller
+
+# --- 自适应轮询间隔测试 ---
+# 用法: python -m pytest test_scheduler.py
+NOW = time.mktime((2025, 11, 3, 3, 0, 0, 0, 0, -1))  # 周一凌晨 3 点（本地时间）
+
+
+def make_poller():
+    return AdaptivePoller(base_interval=300, min_interval=60, max_interval=3600, near_deadline=7200,
+                          publish_threshold=2)
+
+
+def test_idle_backoff_is_exponential_and_capped():
+    poller = make_poller()
+    intervals = [poller.next_interval(False, [], now=NOW)[0] for _ in range(6)]
+    assert intervals == [300, 600, 1200, 2400, 3600, 3600]
+
+
+def test_new_homework_resets_backoff():
+    poller = make_poller()
+    for _ in range(3):
+        poller.next_interval(False, [], now=NOW)
+    assert poller.next_interval(True, [], now=NOW) == (300, "刚发现新作业")
+    assert poller.next_interval(False, [], now=NOW)[0] == 300
+
+
+def test_near_deadline_uses_min_interval():
+    poller = make_poller()
+    assert poller.next_interval(False, [NOW + 3600], now=NOW) == (60, "临近截止")
+    assert poller.next_interval(False, [NOW - 10, NOW + 86400], now=NOW)[1] != "临近截止"  # 已过期或还很远
+
+
+def test_common_publish_hour():
+    poller = make_poller()
+    poller.learn_publish_times([NOW - 7 * 86400, NOW - 14 * 86400 + 60])  # 前两周同一时段各发布一次
+    assert poller.next_interval(False, [], now=NOW) == (120, "常见发布时段")
+    assert poller.next_interval(False, [], now=NOW + 3600)[1] != "常见发布时段"